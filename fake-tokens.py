@@ -15,11 +15,1487 @@ Supported token formats:
 """
 
 import argparse
+import asyncio
+import errno
+import hashlib
+import json
+import math
+import mmap
+import os
+import pickle
 import random
 import string
 import secrets
+import socket
+import socketserver
+import stat
+import struct
 import sys
-from typing import List
+import tempfile
+import threading
+import time
+import urllib.parse
+import weakref
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from functools import lru_cache, partial
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; generate_batch falls back to the stdlib path
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # File locking is POSIX-only; only RegistryStore needs it
+    fcntl = None
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8; only SharedMemoryStore needs them
+    resource_tracker = shared_memory = None
+
+try:
+    from contextlib import nullcontext
+except ImportError:  # Python < 3.7
+    class nullcontext:
+        """Reusable no-op context manager, standing in for a lock when none is needed."""
+        
+        def __enter__(self) -> None:
+            return None
+        
+        def __exit__(self, *exc_info) -> bool:
+            return False
+
+# Bytes pulled from the CSPRNG per refill of an entropy pool
+POOL_BLOCK_SIZE = 64 * 1024
+
+# Ready-pool watermarks of a prefetching generator: a background refill starts
+# when a type has fewer than LOW tokens ready and tops it up to HIGH
+DEFAULT_LOW_WATERMARK = 1000
+DEFAULT_HIGH_WATERMARK = 10000
+
+# Birthday bound below which tokens skip the history (see collision_threshold)
+DEFAULT_COLLISION_THRESHOLD = 2 ** -64
+
+# Most skipped tokens of a type kept to be written to the history once the type
+# switches to tracking (see TestTokenGenerator._skip_tracking)
+MAX_KEPT_UNTRACKED = 1 << 16
+
+# Number of tokens no run could ever reach; a type whose birthday bound stays
+# below the threshold even at this count never has to switch to tracking
+UNREACHABLE_TOKEN_COUNT = 2 ** 64
+
+# Largest ``count`` a single request to the token server may ask for
+MAX_SERVE_COUNT = 1000000
+
+# HTTP server: requests handled at once, largest request body, and the token
+# count above which a request is generated in the worker pool instead of on
+# the event loop
+DEFAULT_HTTP_CONCURRENCY = 256
+MAX_HTTP_BODY = 1024 * 1024
+HTTP_OFFLOAD_THRESHOLD = 1000
+
+# Tokens written between two checkpoints of ``write_checkpointed``
+DEFAULT_CHECKPOINT_INTERVAL = 1000000
+
+# Consecutive duplicates tolerated before giving up on finding a new token
+MAX_RETRIES = 1000
+
+# Tokens generated per internal batch when streaming
+DEFAULT_CHUNK_SIZE = 10000
+
+# Bytes of output collected before each write to stdout
+DEFAULT_OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+class _EntropyPool:
+    """
+    Buffer of CSPRNG output shared by every token type of a generator.
+
+    Pulls large blocks from ``source`` (``os.urandom`` by default) and hands
+    out byte runs on demand, so a token costs a slice instead of one
+    syscall-backed draw per character.
+    """
+
+    def __init__(self, source: Callable[[int], bytes] = os.urandom, block_size: int = POOL_BLOCK_SIZE):
+        self._source = source
+        self._block_size = block_size
+        self._buffer = b""
+        self._offset = 0
+        # Sizes of the source blocks the buffer was cut from (oldest first), and
+        # how many of their bytes precede the buffer
+        self._blocks = []
+        self._start = 0
+
+    def take(self, n: int) -> bytes:
+        """Return the next ``n`` random bytes, refilling from the source when needed."""
+        end = self._offset + n
+        if end > len(self._buffer):
+            block = self._source(max(n, self._block_size))
+            self._buffer = self._buffer[self._offset:] + block
+            self._start += self._offset
+            self._blocks.append(len(block))
+            while self._start >= self._blocks[0]:
+                self._start -= self._blocks.pop(0)
+            self._offset = 0
+            end = n
+        chunk = self._buffer[self._offset:end]
+        self._offset = end
+        return chunk
+
+    def getstate(self) -> Tuple[int, List[int], int]:
+        """
+        Return the position of a pool over a ``_SeededSource``: the counter and
+        sizes of the blocks still buffered, and the offset into them.
+        """
+        return self._source.counter - len(self._blocks), list(self._blocks), self._start + self._offset
+
+    def setstate(self, state: Tuple[int, List[int], int]) -> None:
+        """Restore a position returned by ``getstate``, squeezing the buffered blocks again."""
+        self._source.counter, blocks, self._start = state
+        self._buffer = b"".join([self._source(size) for size in blocks])[self._start:]
+        self._blocks = list(blocks)
+        self._offset = 0
+
+
+class _SeededSource:
+    """
+    Deterministic byte source for seeded generators.
+
+    Each call squeezes one block from SHAKE-256 over the seed and a block
+    counter, so a seed always yields the same byte stream on every platform
+    and Python version.
+    """
+
+    def __init__(self, seed: bytes):
+        self._xof = hashlib.shake_256(b"fake-tokens/stream\0" + seed)
+        self.counter = 0
+
+    def __call__(self, n: int) -> bytes:
+        xof = self._xof.copy()
+        xof.update(self.counter.to_bytes(8, "little"))
+        self.counter += 1
+        return xof.digest(n)
+
+
+def _seed_bytes(seed: Union[int, str, bytes]) -> bytes:
+    """Normalize a user seed (an int, str or bytes) to bytes."""
+    if isinstance(seed, bytes):
+        return seed
+    if isinstance(seed, int):
+        return str(seed).encode("ascii")
+    if isinstance(seed, str):
+        return seed.encode("utf-8")
+    raise TypeError("seed must be an int, str or bytes")
+
+
+def _derive_key(seed: bytes, purpose: str) -> bytes:
+    """Derive a 32-byte key for ``purpose`` from a seed."""
+    return hashlib.shake_256(f"fake-tokens/{purpose}\0".encode("ascii") + seed).digest(32)
+
+
+class _ThreadLocalEntropyPool:
+    """
+    Entropy pool handing every thread its own ``_EntropyPool``, so threads
+    never share (or lock) a buffer.
+    """
+
+    def __init__(self, block_size: int = POOL_BLOCK_SIZE):
+        self._block_size = block_size
+        self._local = threading.local()
+
+    def take(self, n: int) -> bytes:
+        try:
+            pool = self._local.pool
+        except AttributeError:
+            pool = self._local.pool = _EntropyPool(block_size=self._block_size)
+        return pool.take(n)
+
+
+class _Alphabet:
+    """
+    Precompiled byte-to-character mapping for one token alphabet.
+
+    Random bytes are mapped with a single ``bytes.translate`` call. Alphabets
+    whose size divides 256 (the 64-symbol sets) map every byte directly; other
+    sizes delete bytes at or above the largest multiple of the size in the
+    same call, which is unbiased rejection sampling done in bulk.
+    """
+
+    def __init__(self, chars: str):
+        if not 2 <= len(chars) <= 256 or len(set(chars)) != len(chars):
+            raise ValueError("alphabet must contain between 2 and 256 distinct characters")
+        self.chars = chars
+        self.size = len(chars)
+        self.limit = 256 - 256 % self.size
+        self._table = bytes.maketrans(bytes(range(self.limit)),
+                                      chars.encode("ascii") * (self.limit // self.size))
+        self._rejected = bytes(range(self.limit, 256))
+
+    def draw(self, pool: "_EntropyPool", n: int) -> bytes:
+        """Return ``n`` uniformly distributed alphabet characters as ASCII bytes."""
+        if not self._rejected:
+            return pool.take(n).translate(self._table)
+        out = b""
+        while len(out) < n:
+            out += pool.take(self._oversample(n - len(out))).translate(self._table, self._rejected)
+        return out[:n]
+
+    def draw_array(self, pool: "_EntropyPool", n: int) -> "np.ndarray":
+        """Vectorized ``draw``: return ``n`` characters as a uint8 NumPy array via a lookup array."""
+        lookup = np.frombuffer(self._table, dtype=np.uint8)
+        if n <= 0:
+            return lookup[:0]
+        if not self._rejected:
+            return lookup[np.frombuffer(pool.take(n), dtype=np.uint8)]
+        parts = []
+        have = 0
+        while have < n:
+            raw = np.frombuffer(pool.take(self._oversample(n - have)), dtype=np.uint8)
+            kept = raw[raw < self.limit]
+            parts.append(kept)
+            have += len(kept)
+        return lookup[np.concatenate(parts)[:n]]
+
+    def _oversample(self, missing: int) -> int:
+        """Bytes to draw for ``missing`` characters: expected rejection rate plus a margin."""
+        return missing * 256 // self.limit + (missing >> 5) + 8
+
+
+@lru_cache(maxsize=None)
+def _compile_alphabet(chars: str) -> _Alphabet:
+    """Return the shared precompiled mapping for ``chars``."""
+    return _Alphabet(chars)
+
+
+_BASE62 = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+
+def _crc32_base62(data: str) -> str:
+    """Checksum used by GitHub-style tokens: CRC32 of the random part as 6 base62 digits."""
+    value = zlib.crc32(data.encode("ascii"))
+    digits = []
+    for _ in range(6):
+        value, digit = divmod(value, 62)
+        digits.append(_BASE62[digit])
+    return ''.join(reversed(digits))
+
+# Checksum name -> (number of characters, function of the random characters, characters it can produce)
+CHECKSUMS = {
+    "crc32_base62": (6, _crc32_base62, _BASE62),
+}
+
+
+class TokenSpec(NamedTuple):
+    """
+    Declarative description of a token format.
+    
+    Attributes:
+        name: Token type name used by ``generate_batch`` and the CLI
+        prefix: Literal prefix of every token
+        alphabet: Characters the random part is drawn from
+        length: Number of characters after the prefix, including separators and checksum
+        segments: Optional lengths of body segments joined by ``separator`` (default: one segment)
+        separator: Character placed between segments
+        checksum: Optional name of a ``CHECKSUMS`` entry appended to the random characters
+    """
+    name: str
+    prefix: str
+    alphabet: str
+    length: int
+    segments: Tuple[int, ...] = ()
+    separator: str = "_"
+    checksum: Optional[str] = None
+
+
+class _CompiledSpec:
+    """
+    A ``TokenSpec`` specialized for generation.
+    
+    The prefix, alphabet table, body layout and checksum are resolved once, so
+    calling it only draws the random characters and assembles the token.
+    """
+    
+    def __init__(self, spec: TokenSpec):
+        segments = spec.segments or (spec.length,)
+        if sum(segments) + len(segments) - 1 != spec.length:
+            raise ValueError("segments and separators must add up to the token length")
+        if spec.checksum and spec.checksum not in CHECKSUMS:
+            raise ValueError("checksum must be one of %s" % ", ".join("'%s'" % name for name in CHECKSUMS))
+        checksum_length, self._checksum, digits = CHECKSUMS[spec.checksum] if spec.checksum else (0, None, "")
+        if not set(digits) <= set(spec.alphabet):
+            # A token must stay within its alphabet, checksum included
+            raise ValueError(f"checksum {spec.checksum!r} produces characters outside the alphabet")
+        self.spec = spec
+        self.prefix = spec.prefix
+        self.alphabet = _compile_alphabet(spec.alphabet)
+        self.random_length = sum(segments) - checksum_length
+        # Number of distinct tokens (the checksum is determined by the random characters)
+        self.space = self.alphabet.size ** self.random_length
+        if self.random_length < 1:
+            raise ValueError("token body must contain at least one random character")
+        self.width = len(spec.prefix) + spec.length
+        self.plain = len(segments) == 1 and self._checksum is None
+        self._bounds = []
+        offset = 0
+        for segment in segments:
+            self._bounds.append((offset, offset + segment))
+            offset += segment
+        self._template = None
+    
+    def __call__(self, pool: _EntropyPool) -> str:
+        """Generate one token."""
+        chars = self.alphabet.draw(pool, self.random_length).decode("ascii")
+        return self.prefix + chars if self.plain else self.assemble(chars)
+    
+    def batch(self, pool: _EntropyPool, count: int) -> List[str]:
+        """Generate ``count`` tokens from a single draw of random characters."""
+        n = self.random_length
+        flat = self.alphabet.draw(pool, count * n).decode("ascii")
+        if self.plain:
+            prefix = self.prefix
+            return [prefix + flat[i:i + n] for i in range(0, len(flat), n)]
+        return [self.assemble(flat[i:i + n]) for i in range(0, len(flat), n)]
+    
+    def batch_array(self, pool: _EntropyPool, count: int) -> "np.ndarray":
+        """Vectorized ``batch``: return ``count`` tokens as a NumPy ``S``-dtype array."""
+        if self._checksum is not None:
+            return np.array(self.batch(pool, count), dtype="S%d" % self.width)
+        if self._template is None:
+            # NUL marks the columns filled with random characters
+            template = self.assemble("\0" * self.random_length).encode("ascii")
+            self._template = np.frombuffer(template, dtype=np.uint8)
+            self._random_columns = np.flatnonzero(self._template == 0)
+        chars = self.alphabet.draw_array(pool, count * self.random_length).reshape(count, self.random_length)
+        rows = np.empty((count, self.width), dtype=np.uint8)
+        rows[:] = self._template
+        if self.plain:
+            rows[:, len(self.prefix):] = chars
+        else:
+            rows[:, self._random_columns] = chars
+        return rows.view("S%d" % self.width).ravel()
+    
+    def assemble(self, chars: str) -> str:
+        """Build a token from ``random_length`` body characters (adds checksum, separators and prefix)."""
+        if self.plain:
+            return self.prefix + chars
+        if self._checksum is not None:
+            chars += self._checksum(chars)
+        body = self.spec.separator.join(chars[start:end] for start, end in self._bounds)
+        return self.prefix + body
+
+
+@lru_cache(maxsize=None)
+def _compile_spec(spec: TokenSpec) -> _CompiledSpec:
+    """Return the shared specialized generator for ``spec``."""
+    return _CompiledSpec(spec)
+
+
+def _digit_count(value: int, base: int) -> int:
+    """Number of base-``base`` digits needed to write ``value`` (at least 1)."""
+    width = 1
+    while value >= base:
+        value //= base
+        width += 1
+    return width
+
+
+@lru_cache(maxsize=None)
+def _digit_pairs(chars: str) -> List[str]:
+    """All two-digit strings of the alphabet ``chars``, indexed by their value."""
+    return [high + low for high in chars for low in chars]
+
+
+def _encode_digits(value: int, chars: str, width: int) -> str:
+    """Write ``value`` as exactly ``width`` digits of the alphabet ``chars``, most significant first."""
+    # Peel off two digits per division to halve the big-integer work
+    pairs = _digit_pairs(chars)
+    pair_base = len(pairs)
+    digits = []
+    for _ in range(width >> 1):
+        value, pair = divmod(value, pair_base)
+        digits.append(pairs[pair])
+    if width & 1:
+        digits.append(chars[value % len(chars)])
+    return ''.join(reversed(digits))
+
+
+class _ShardEncoder:
+    """
+    Shard-mode body builder for one token type.
+    
+    The last characters of the random part are reserved for the shard id and a
+    per-shard counter, written as alphabet digits. Two tokens can only be equal
+    if shard id and counter are equal, so shards never collide and no history
+    is needed. The reserved value is offset by a hash of the token's random
+    characters, so the counter doesn't show as a visible sequence.
+    """
+    
+    def __init__(self, compiled: _CompiledSpec, shard_id: int, shard_count: int, counter_bits: int):
+        base = compiled.alphabet.size
+        counter_width = _digit_count((1 << counter_bits) - 1, base)
+        self.compiled = compiled
+        self.counter = 0
+        self._counter_limit = 1 << counter_bits
+        self._shard_offset = shard_id * base ** counter_width
+        self._width = _digit_count(shard_count - 1, base) + counter_width
+        self._space = base ** self._width
+        self.free_length = compiled.random_length - self._width
+        if self.free_length < 1:
+            raise ValueError(f"'{compiled.spec.name}' tokens are too short to encode {shard_count} shards "
+                             f"with a {counter_bits}-bit counter")
+    
+    def batch(self, pool: _EntropyPool, count: int) -> List[str]:
+        """Generate ``count`` tokens, consuming ``count`` counter values."""
+        if count <= 0:
+            return []
+        if self.counter + count > self._counter_limit:
+            raise OverflowError(f"shard counter exhausted for '{self.compiled.spec.name}' tokens")
+        compiled = self.compiled
+        chars = compiled.alphabet.chars
+        n = self.free_length
+        flat = compiled.alphabet.draw(pool, count * n).decode("ascii")
+        tokens = []
+        for counter, i in enumerate(range(0, len(flat), n), self._shard_offset + self.counter):
+            free = flat[i:i + n]
+            # The offset depends only on the random characters, so adding it
+            # modulo the reserved space never breaks uniqueness
+            mask = int.from_bytes(hashlib.blake2b(free.encode("ascii"), digest_size=16).digest(), "big")
+            reserved = _encode_digits((counter + mask) % self._space, chars, self._width)
+            tokens.append(compiled.assemble(free + reserved))
+        self.counter += count
+        return tokens
+
+
+class _CounterEncoder:
+    """
+    Counter-mode body builder for one token type.
+    
+    The n-th token is a keyed Feistel permutation of ``n`` over the largest
+    power-of-two range that fits in the type's body space, written as alphabet
+    digits. A permutation never maps two counters to the same value, so tokens
+    are unique by construction, without history or retries.
+    """
+    
+    ROUNDS = 6
+    
+    def __init__(self, compiled: _CompiledSpec, key: bytes):
+        # blake2b digests are at most 512 bits, which bounds each Feistel half
+        self.bits = min(compiled.space.bit_length() - 1, 1024)
+        self.compiled = compiled
+        self.counter = 0
+        self._right_bits = self.bits // 2
+        # Halves swap every round, so with an odd bit count their widths alternate
+        widths = [(self.bits - self._right_bits, self._right_bits), (self._right_bits, self.bits - self._right_bits)]
+        self._rounds = []
+        for i in range(self.ROUNDS):
+            left_bits, right_bits = widths[i & 1]
+            round_key = hashlib.blake2b(f"{compiled.spec.name}:{i}".encode(), key=key).digest()
+            # Keyed hash objects are copied per call, which skips re-running the key setup
+            hasher = hashlib.blake2b(key=round_key, digest_size=(left_bits + 7) // 8 or 1)
+            self._rounds.append((hasher, (right_bits + 7) // 8 or 1, (1 << left_bits) - 1))
+    
+    def permute(self, value: int) -> int:
+        """Map ``value`` in ``range(2 ** bits)`` to its keyed image in the same range."""
+        right_bits = self._right_bits
+        left, right = value >> right_bits, value & ((1 << right_bits) - 1)
+        for hasher, right_bytes, left_mask in self._rounds:
+            round_hash = hasher.copy()
+            round_hash.update(right.to_bytes(right_bytes, "big"))
+            left, right = right, left ^ (int.from_bytes(round_hash.digest(), "big") & left_mask)
+        # An even number of rounds restores the original half widths
+        return (left << right_bits) | right
+    
+    def reserve(self, count: int) -> int:
+        """Claim ``count`` consecutive counter values (none if ``count`` <= 0) and return the first one."""
+        start = self.counter
+        count = max(count, 0)
+        if start + count > 1 << self.bits:
+            raise OverflowError(f"counter space exhausted for '{self.compiled.spec.name}' tokens")
+        self.counter += count
+        return start
+    
+    def token(self, counter: int) -> str:
+        """Return the token for ``counter``."""
+        compiled = self.compiled
+        return compiled.assemble(_encode_digits(self.permute(counter), compiled.alphabet.chars, compiled.random_length))
+    
+    def tokens(self, start: int, count: int) -> List[str]:
+        """Return the tokens for counters ``start`` to ``start + count - 1``."""
+        compiled = self.compiled
+        chars = compiled.alphabet.chars
+        length = compiled.random_length
+        return [compiled.assemble(_encode_digits(self.permute(counter), chars, length))
+                for counter in range(start, start + count)]
+    
+    def batch(self, pool: _EntropyPool, count: int) -> List[str]:
+        """Generate the next ``count`` tokens (the entropy pool is not used)."""
+        return self.tokens(self.reserve(count), count)
+
+
+class UniquenessStore(ABC):
+    """
+    Interface of the token history behind ``ensure_unique``.
+    
+    ``add`` records a token and returns True only if it was not recorded
+    before; ``len`` is the number of tokens recorded. ``add_many`` is the bulk
+    form used for batches, which stores may override with a faster path.
+    
+    A history may also be any object with ``add``, ``in``, ``len`` and
+    ``clear`` that does not derive from this class; batches are then recorded
+    with the default ``add_many`` (see ``_add_many``).
+    """
+    
+    @abstractmethod
+    def add(self, token: str) -> bool:
+        """Record ``token``; return True if it was not recorded before."""
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        """
+        Record a batch of tokens.
+        
+        Returns:
+            Indices of the tokens that were not new: already recorded, or
+            repeating an earlier token of the same batch
+        """
+        add = self.add
+        return [i for i, token in enumerate(tokens) if not add(token)]
+    
+    @abstractmethod
+    def __contains__(self, token: str) -> bool:
+        """Return True if ``token`` is recorded."""
+    
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the number of tokens recorded."""
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Forget every recorded token."""
+
+
+def _add_many(store, tokens: List[str]) -> List[int]:
+    """
+    Record ``tokens`` in any history (see ``UniquenessStore``): a store's own
+    ``add_many`` if it derives from ``UniquenessStore``, else one ``add`` per token.
+    """
+    if isinstance(store, UniquenessStore):
+        return store.add_many(tokens)
+    return UniquenessStore.add_many(store, tokens)
+
+
+class SetStore(set, UniquenessStore):
+    """Exact history keeping every token string in a ``set``."""
+    
+    def add(self, token: str) -> bool:
+        if token in self:
+            return False
+        set.add(self, token)
+        return True
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        # One hash-set pass for the common case of a batch with no repeats
+        batch = set(tokens)
+        if len(batch) == len(tokens) and self.isdisjoint(batch):
+            self.update(batch)
+            return []
+        return UniquenessStore.add_many(self, tokens)
+
+
+class CompactStore(UniquenessStore):
+    """
+    History of keyed token fingerprints in sorted ``array('Q')`` shards.
+    
+    Each token is reduced to a 64- or 128-bit fingerprint. Fingerprints are
+    routed to a shard by their top bits and kept sorted within it, so lookups
+    and inserts are a ``bisect`` plus an ``insert`` on a small array, and the
+    table costs about 9 bytes per token (64-bit) instead of the ~120 of a
+    ``set`` of 40-character strings. When shards fill up, each one is split in
+    two by the next fingerprint bit, which is a single slice per shard. Two
+    distinct tokens are only confused if their fingerprints are equal, which
+    for 64-bit fingerprints and 100M tokens happens with probability ~1e-11
+    per lookup.
+    
+    64-bit fingerprints use the interpreter's keyed (per-process) string hash
+    unless ``key`` is given; 128-bit fingerprints and explicit keys use keyed
+    BLAKE2b.
+    """
+    
+    SHARD_SIZE = 2048
+    
+    def __init__(self, capacity: int = 1024, fingerprint_bits: int = 64, key: Optional[bytes] = None):
+        """
+        Args:
+            capacity: Number of tokens to size the initial shard count for
+            fingerprint_bits: 64 or 128
+            key: Fingerprint key (default: per-process hash for 64 bits, random for 128 bits)
+        """
+        if fingerprint_bits not in (64, 128):
+            raise ValueError("fingerprint_bits must be 64 or 128")
+        if fingerprint_bits == 128 and key is None:
+            key = secrets.token_bytes(32)
+        self.fingerprint_bits = fingerprint_bits
+        self._key = key
+        self._hasher = hashlib.blake2b(key=key, digest_size=fingerprint_bits // 8) if key is not None else None
+        self._initial_bits = max(capacity // self.SHARD_SIZE, 1).bit_length() - 1
+        self._allocate(self._initial_bits)
+    
+    def _allocate(self, bits: int) -> None:
+        self._bits = bits
+        self._shift = 64 - bits
+        self._high = [array("Q") for _ in range(1 << bits)]
+        self._low = [array("Q") for _ in range(1 << bits)] if self.fingerprint_bits == 128 else None
+        self._limit = self.SHARD_SIZE << bits
+        self._count = 0
+    
+    def _fingerprint(self, token: str) -> Tuple[int, int]:
+        """Return the (high, low) fingerprint words; shards and order follow ``high``."""
+        if self._hasher is None:
+            return hash(token) & 0xFFFFFFFFFFFFFFFF, 0
+        hasher = self._hasher.copy()
+        hasher.update(token.encode("utf-8"))
+        value = int.from_bytes(hasher.digest(), "little")
+        return value & 0xFFFFFFFFFFFFFFFF, value >> 64
+    
+    def _find(self, high: int, low: int) -> Tuple[int, int, bool]:
+        """Return ``(shard, index, found)``; ``index`` is where a missing fingerprint belongs."""
+        shard = high >> self._shift
+        highs = self._high[shard]
+        i = bisect_left(highs, high)
+        if self._low is None:
+            return shard, i, i < len(highs) and highs[i] == high
+        lows = self._low[shard]
+        while i < len(highs) and highs[i] == high:
+            if lows[i] == low:
+                return shard, i, True
+            i += 1
+        return shard, i, False
+    
+    def _insert(self, high: int, low: int) -> bool:
+        shard, i, found = self._find(high, low)
+        if found:
+            return False
+        self._high[shard].insert(i, high)
+        if self._low is not None:
+            self._low[shard].insert(i, low)
+        self._count += 1
+        if self._count > self._limit:
+            self._split()
+        return True
+    
+    def _split(self) -> None:
+        """Double the shard count by splitting every shard on the next fingerprint bit."""
+        old_high, old_low, count = self._high, self._low, self._count
+        half = 1 << (self._shift - 1)
+        highs, lows = [], []
+        for shard, entries in enumerate(old_high):
+            cut = bisect_left(entries, (shard << self._shift) | half)
+            highs += [entries[:cut], entries[cut:]]
+            if old_low is not None:
+                lows += [old_low[shard][:cut], old_low[shard][cut:]]
+        self._allocate(self._bits + 1)
+        self._high, self._count = highs, count
+        if old_low is not None:
+            self._low = lows
+    
+    def add(self, token: str) -> bool:
+        if self._hasher is not None:
+            return self._insert(*self._fingerprint(token))
+        # Inlined 64-bit path: this runs once per generated token
+        high = hash(token) & 0xFFFFFFFFFFFFFFFF
+        highs = self._high[high >> self._shift]
+        i = bisect_left(highs, high)
+        if i < len(highs) and highs[i] == high:
+            return False
+        highs.insert(i, high)
+        self._count += 1
+        if self._count > self._limit:
+            self._split()
+        return True
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        if self._hasher is not None:
+            return UniquenessStore.add_many(self, tokens)
+        # Split up front for the whole batch so shards stay small while it is filled
+        while self._count + len(tokens) > self._limit:
+            self._split()
+        if np is not None and tokens:
+            rejected = self._add_many_numpy(tokens)
+        else:
+            # Repeats within the batch are caught by the same lookup as history hits
+            shards, shift = self._high, self._shift
+            rejected = []
+            for i, token in enumerate(tokens):
+                high = hash(token) & 0xFFFFFFFFFFFFFFFF
+                highs = shards[high >> shift]
+                j = bisect_left(highs, high)
+                if j < len(highs) and highs[j] == high:
+                    rejected.append(i)
+                else:
+                    highs.insert(j, high)
+        self._count += len(tokens) - len(rejected)
+        return rejected
+    
+    def _add_many_numpy(self, tokens: List[str]) -> List[int]:
+        """
+        Vectorized 64-bit ``add_many``: sort the batch fingerprints once, drop
+        repeats, and merge each touched shard with one ``searchsorted``/``insert``.
+        """
+        prints = np.fromiter([hash(token) & 0xFFFFFFFFFFFFFFFF for token in tokens],
+                             dtype=np.uint64, count=len(tokens))
+        order = np.argsort(prints, kind="stable")
+        prints = prints[order]
+        # new[i]: sorted fingerprint i is neither a repeat within the batch nor in history
+        new = np.ones(len(prints), dtype=bool)
+        new[1:] = prints[1:] != prints[:-1]
+        if self._shift < 64:
+            shard_ids = (prints >> np.uint64(self._shift)).astype(np.int64)
+        else:
+            shard_ids = np.zeros(len(prints), dtype=np.int64)
+        bounds = (np.flatnonzero(np.diff(shard_ids)) + 1).tolist()
+        for start, end in zip([0] + bounds, bounds + [len(prints)]):
+            shard = int(shard_ids[start])
+            batch = prints[start:end]
+            entries = self._high[shard]
+            if entries:
+                existing = np.frombuffer(entries, dtype=np.uint64)
+                positions = np.searchsorted(existing, batch)
+                new[start:end] &= existing[np.minimum(positions, len(existing) - 1)] != batch
+            else:
+                existing = batch[:0]
+                positions = np.zeros(len(batch), dtype=np.intp)
+            keep = new[start:end]
+            self._high[shard] = array("Q", np.insert(existing, positions[keep], batch[keep]).tobytes())
+        return np.sort(order[~new]).tolist()
+    
+    def __contains__(self, token: str) -> bool:
+        return self._find(*self._fingerprint(token))[2]
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def clear(self) -> None:
+        self._allocate(self._initial_bits)
+    
+    def __getstate__(self) -> dict:
+        if self._hasher is None:
+            raise TypeError("a CompactStore without a key fingerprints with the per-process hash() "
+                            "and can't be saved; pass key=")
+        state = self.__dict__.copy()
+        del state["_hasher"]
+        return state
+    
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._hasher = hashlib.blake2b(key=self._key, digest_size=self.fingerprint_bits // 8)
+    
+    def memory_usage(self) -> int:
+        """Bytes held by the fingerprint shards."""
+        shards = self._high + (self._low or [])
+        return sys.getsizeof(self._high) + sum(sys.getsizeof(entries) for entries in shards)
+
+
+class BloomStore(UniquenessStore):
+    """
+    Fixed-size probabilistic history backed by a Bloom filter bit array.
+    
+    Memory is fixed up front (``capacity`` tokens at ``fp_rate``); a new token
+    is occasionally reported as seen (a false positive) and gets regenerated,
+    but a recorded token is never reported as new. ``len`` is the exact number
+    of tokens accepted. Past ``capacity`` the memory stays the same and the
+    false-positive rate rises.
+    """
+    
+    def __init__(self, capacity: int = 1000000, fp_rate: float = 1e-6, key: Optional[bytes] = None):
+        """
+        Args:
+            capacity: Number of tokens the filter is sized for
+            fp_rate: Target false-positive rate at ``capacity`` tokens
+            key: Hash key (default: random)
+        """
+        if capacity < 1 or not 0 < fp_rate < 1:
+            raise ValueError("capacity must be positive and fp_rate between 0 and 1")
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.bit_count = max(int(-capacity * math.log(fp_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.bit_count / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.bit_count + 7) // 8)
+        self._key = key or secrets.token_bytes(32)
+        self._hasher = hashlib.blake2b(key=self._key, digest_size=16)
+        self._count = 0
+    
+    def _positions(self, token: str) -> List[int]:
+        # Double hashing: k positions from two independent 64-bit hashes
+        hasher = self._hasher.copy()
+        hasher.update(token.encode("utf-8"))
+        digest = hasher.digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        size = self.bit_count
+        return [(first + i * second) % size for i in range(self.hash_count)]
+    
+    def add(self, token: str) -> bool:
+        bits = self._bits
+        positions = self._positions(token)
+        if all(bits[p >> 3] & (1 << (p & 7)) for p in positions):
+            return False
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        self._count += 1
+        return True
+    
+    def __contains__(self, token: str) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(token))
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def clear(self) -> None:
+        self._bits = bytearray(len(self._bits))
+        self._count = 0
+    
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_hasher"]
+        return state
+    
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._hasher = hashlib.blake2b(key=self._key, digest_size=16)
+    
+    def memory_usage(self) -> int:
+        """Bytes held by the bit array."""
+        return sys.getsizeof(self._bits)
+
+
+class RegistryStore(UniquenessStore):
+    """
+    Persistent history shared by every process that opens the same file.
+    
+    The file is an open-addressing hash table of keyed 64-bit fingerprints
+    (0 marks an empty slot) behind a small header holding the table size and
+    offset, the token count and the fingerprint key, so every run hashes
+    tokens the same way. The table is memory-mapped and probed linearly from
+    the slot picked by the fingerprint, so a lookup touches one page in the
+    common case and the table never has to be loaded. Every operation holds an
+    ``flock`` on the file (exclusive for writes, shared for reads), which makes
+    concurrent writers from separate processes safe.
+    
+    The table doubles whenever it would become more than half full. The larger
+    table is built past the end of the file, streaming entries across from the
+    old one, and only then does a single header write switch to it: a process
+    killed mid-grow leaves the old table in use, intact. Other processes notice
+    the switch from the header and remap. Space of replaced tables is not
+    reclaimed, so the file stays under twice the size of the live table.
+    """
+    
+    MAGIC = b"FTOKREG2"
+    # magic, slot count, token count, fingerprint key, table offset
+    HEADER = struct.Struct("<8sQQ32sQ")
+    HEADER_SIZE = 64
+    
+    def __init__(self, path: str, capacity: int = 65536):
+        """
+        Args:
+            path: Registry file, created if it does not exist
+            capacity: Number of tokens to size a new table for
+        """
+        if fcntl is None:
+            raise ImportError("RegistryStore requires fcntl (POSIX)")
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._map = None
+        self._slots = 0
+        self._offset = 0
+        with self._locked(fcntl.LOCK_EX):
+            # Only a file holding nothing but zero bytes is initialized: a new one,
+            # or one whose creator was killed before writing the header
+            if self._is_blank():
+                slots = 1 << max(2 * capacity - 1, 1).bit_length()
+                os.ftruncate(self._fd, self.HEADER_SIZE + 8 * slots)
+                self._commit(slots, 0, secrets.token_bytes(32), self.HEADER_SIZE)
+            valid = (os.fstat(self._fd).st_size >= self.HEADER_SIZE + 8
+                     and self._header()[0] == self.MAGIC)
+            if valid:
+                self._sync()
+                key = self._header()[3]
+        if not valid:
+            os.close(self._fd)
+            raise ValueError(f"{path} is not a token registry")
+        self._hasher = hashlib.blake2b(key=key, digest_size=8)
+    
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+    
+    def _is_blank(self) -> bool:
+        """Whether the file is empty or all zero bytes, i.e. holds no data to lose."""
+        offset = 0
+        while True:
+            block = os.pread(self._fd, 1 << 20, offset)
+            if not block:
+                return True
+            if block.count(0) != len(block):
+                return False
+            offset += len(block)
+    
+    def _header(self) -> Tuple[bytes, int, int, bytes, int]:
+        """Return ``(magic, slots, count, key, offset)`` as currently stored in the file."""
+        return self.HEADER.unpack(os.pread(self._fd, self.HEADER.size, 0))
+    
+    def _commit(self, slots: int, count: int, key: bytes, offset: int) -> None:
+        """Point the header at a fully written table, in one write after the table is on disk."""
+        if self._map is not None:
+            self._map.flush()
+        os.fsync(self._fd)
+        os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, slots, count, key, offset), 0)
+        os.fsync(self._fd)
+    
+    def _map_table(self, slots: int, offset: int) -> None:
+        self._map = mmap.mmap(self._fd, offset + 8 * slots)
+        self._table = memoryview(self._map)[offset:].cast("Q")
+        self._slots = slots
+        self._offset = offset
+    
+    def _sync(self) -> int:
+        """Remap the table if another process grew it; return the token count (lock held)."""
+        _, slots, count, _, offset = self._header()
+        if (slots, offset) != (self._slots, self._offset):
+            self._unmap()
+            self._map_table(slots, offset)
+        return count
+    
+    def _unmap(self) -> None:
+        if self._map is not None:
+            self._table.release()
+            self._map.close()
+            self._map = None
+            self._slots = 0
+            self._offset = 0
+    
+    def _grow(self, count: int, incoming: int) -> None:
+        """Double the table until ``count + incoming`` tokens fit at half load (exclusive lock held)."""
+        slots = self._slots
+        while 2 * (count + incoming) > slots:
+            slots *= 2
+        if slots == self._slots:
+            return
+        offset = os.fstat(self._fd).st_size
+        offset += -offset % 8
+        os.ftruncate(self._fd, offset + 8 * slots)
+        old_map, old_table = self._map, self._table
+        self._map = None
+        self._map_table(slots, offset)
+        table, mask = self._table, slots - 1
+        for fingerprint in old_table:
+            if fingerprint:
+                i = fingerprint & mask
+                while table[i]:
+                    i = (i + 1) & mask
+                table[i] = fingerprint
+        old_table.release()
+        old_map.close()
+        self._commit(slots, count, self._header()[3], offset)
+    
+    def _set_count(self, count: int) -> None:
+        struct.pack_into("<Q", self._map, 16, count)
+    
+    def _fingerprint(self, token: str) -> int:
+        hasher = self._hasher.copy()
+        hasher.update(token.encode("utf-8"))
+        return int.from_bytes(hasher.digest(), "little") or 1
+    
+    def _insert(self, fingerprint: int) -> bool:
+        table, mask = self._table, self._slots - 1
+        i = fingerprint & mask
+        while table[i]:
+            if table[i] == fingerprint:
+                return False
+            i = (i + 1) & mask
+        table[i] = fingerprint
+        return True
+    
+    def add(self, token: str) -> bool:
+        return not self.add_many([token])
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        fingerprint = self._fingerprint
+        with self._locked(fcntl.LOCK_EX):
+            count = self._sync()
+            self._grow(count, len(tokens))
+            insert = self._insert
+            rejected = [i for i, token in enumerate(tokens) if not insert(fingerprint(token))]
+            self._set_count(count + len(tokens) - len(rejected))
+        return rejected
+    
+    def __contains__(self, token: str) -> bool:
+        fingerprint = self._fingerprint(token)
+        with self._locked(fcntl.LOCK_SH):
+            self._sync()
+            table, mask = self._table, self._slots - 1
+            i = fingerprint & mask
+            while table[i]:
+                if table[i] == fingerprint:
+                    return True
+                i = (i + 1) & mask
+        return False
+    
+    def __len__(self) -> int:
+        with self._locked(fcntl.LOCK_SH):
+            return self._header()[2]
+    
+    def clear(self) -> None:
+        """Forget every token recorded by any run (keeps the table size and key)."""
+        with self._locked(fcntl.LOCK_EX):
+            self._sync()
+            self._set_count(0)
+            self._map[self._offset:] = bytes(8 * self._slots)
+    
+    def close(self) -> None:
+        """Unmap the table and close the file."""
+        self._unmap()
+        os.close(self._fd)
+
+
+class WindowStore(UniquenessStore):
+    """
+    History of only the last ``size`` tokens recorded.
+    
+    Memory stays bounded; a token is only guaranteed not to repeat one of the
+    ``size`` tokens before it. ``evictions`` counts tokens dropped so far.
+    """
+    
+    def __init__(self, size: int):
+        """
+        Args:
+            size: Number of most recent tokens remembered
+        """
+        if size < 1:
+            raise ValueError("size must be positive")
+        self.size = size
+        self.evictions = 0
+        self._tokens = set()
+        self._order = deque()
+    
+    def add(self, token: str) -> bool:
+        if token in self._tokens:
+            return False
+        self._tokens.add(token)
+        self._order.append(token)
+        if len(self._order) > self.size:
+            self._tokens.discard(self._order.popleft())
+            self.evictions += 1
+        return True
+    
+    def __contains__(self, token: str) -> bool:
+        return token in self._tokens
+    
+    def __len__(self) -> int:
+        return len(self._tokens)
+    
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._order.clear()
+
+
+class TTLStore(UniquenessStore):
+    """
+    History that forgets each token ``ttl`` seconds after it was recorded.
+    
+    Expired tokens are dropped lazily, oldest first, whenever the store is
+    used; ``evictions`` counts tokens expired so far.
+    """
+    
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            ttl: Seconds a token is remembered
+            clock: Time source in seconds
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.ttl = ttl
+        self.evictions = 0
+        self._clock = clock
+        # token -> expiry; with a fixed ttl, insertion order is expiry order
+        self._expiry = OrderedDict()
+    
+    def _expire(self) -> None:
+        expiry, now = self._expiry, self._clock()
+        while expiry and next(iter(expiry.values())) <= now:
+            expiry.popitem(last=False)
+            self.evictions += 1
+    
+    def add(self, token: str) -> bool:
+        self._expire()
+        if token in self._expiry:
+            return False
+        self._expiry[token] = self._clock() + self.ttl
+        return True
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        self._expire()
+        expiry, deadline = self._expiry, self._clock() + self.ttl
+        rejected = []
+        for i, token in enumerate(tokens):
+            if token in expiry:
+                rejected.append(i)
+            else:
+                expiry[token] = deadline
+        return rejected
+    
+    def __contains__(self, token: str) -> bool:
+        self._expire()
+        return token in self._expiry
+    
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._expiry)
+    
+    def clear(self) -> None:
+        self._expiry.clear()
+
+
+class GenerationalStore(UniquenessStore):
+    """
+    History rotated in whole generations of ``generation_size`` tokens.
+    
+    Tokens go into the current generation; once it is full it is retired and
+    a new one started, and the oldest of the ``generations`` kept is dropped
+    at once. A token is guaranteed not to repeat at least the last
+    ``(generations - 1) * generation_size`` tokens, and eviction costs one
+    set deallocation instead of per-token bookkeeping. ``evictions`` counts
+    tokens dropped and ``rotations`` the generations retired.
+    """
+    
+    def __init__(self, generation_size: int, generations: int = 2):
+        """
+        Args:
+            generation_size: Tokens per generation
+            generations: Generations kept, including the current one (at least 2)
+        """
+        if generation_size < 1 or generations < 2:
+            raise ValueError("generation_size must be positive and generations at least 2")
+        self.generation_size = generation_size
+        self.evictions = 0
+        self.rotations = 0
+        # Newest generation first
+        self._generations = deque([set()], maxlen=generations)
+    
+    def add(self, token: str) -> bool:
+        generations = self._generations
+        if any(token in generation for generation in generations):
+            return False
+        current = generations[0]
+        current.add(token)
+        if len(current) >= self.generation_size:
+            if len(generations) == generations.maxlen:
+                self.evictions += len(generations[-1])
+            generations.appendleft(set())
+            self.rotations += 1
+        return True
+    
+    def __contains__(self, token: str) -> bool:
+        return any(token in generation for generation in self._generations)
+    
+    def __len__(self) -> int:
+        return sum(len(generation) for generation in self._generations)
+    
+    def clear(self) -> None:
+        self._generations = deque([set()], maxlen=self._generations.maxlen)
+
+
+class SharedMemoryStore(UniquenessStore):
+    """
+    History in a named shared-memory segment that every process on the host
+    attaching to ``name`` shares, e.g. all pytest-xdist workers of a session.
+    
+    The segment holds a fixed-size table of keyed 64-bit fingerprints split
+    into ``stripes`` independent open-addressing tables. The low fingerprint
+    bits pick the stripe, and each stripe is guarded by its own ``lockf``
+    byte-range lock on a companion lock file, so workers only contend when
+    they hit the same stripe and a check costs a lock/unlock pair plus a probe,
+    a few microseconds. No coordinating process is needed: the first process
+    to attach creates and initializes the segment, later ones read the table
+    geometry and key from its header.
+    
+    The table cannot grow: a stripe raises OverflowError once it is 3/4 full,
+    so size ``capacity`` for the whole session. Locks are per process, so use
+    one store per process; call ``unlink`` once when the session is over.
+    """
+    
+    MAGIC = b"FTOKSHM1"
+    # magic, slots per stripe, stripe count, fingerprint key; per-stripe token
+    # counts follow at HEADER_SIZE, then the stripes
+    HEADER = struct.Struct("<8sQQ32s")
+    HEADER_SIZE = 64
+    
+    def __init__(self, name: str, capacity: int = 1000000, stripes: int = 64):
+        """
+        Args:
+            name: Shared-memory segment name; every process using it shares the history
+            capacity: Number of tokens to size a new table for
+            stripes: Number of independently locked stripes of a new table (a power of two)
+        """
+        if fcntl is None:
+            raise ImportError("SharedMemoryStore requires fcntl (POSIX)")
+        if shared_memory is None:
+            raise ImportError("SharedMemoryStore requires Python 3.8+ (multiprocessing.shared_memory)")
+        if stripes < 1 or stripes & (stripes - 1):
+            raise ValueError("stripes must be a power of two")
+        self.name = name
+        self._untracked = False
+        self._lock_fd = os.open(os.path.join(tempfile.gettempdir(), f"fake-tokens-{name}.lock"),
+                                os.O_RDWR | os.O_CREAT, 0o644)
+        # Byte 0 of the lock file serializes creation; byte 1 + i guards stripe i
+        with self._locked(-1):
+            try:
+                stripe_slots = 1 << max(-(-4 * capacity // (3 * stripes)) - 1, 7).bit_length()
+                self._shm = self._open(True, self.HEADER_SIZE + 8 * stripes * (1 + stripe_slots))
+                self.HEADER.pack_into(self._shm.buf, 0, self.MAGIC, stripe_slots, stripes, secrets.token_bytes(32))
+            except FileExistsError:
+                self._shm = self._open(False)
+        magic, self._stripe_slots, self._stripes, key = self.HEADER.unpack_from(self._shm.buf)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f"shared memory segment {name} is not a token table")
+        self._view = self._shm.buf[self.HEADER_SIZE:self.HEADER_SIZE + 8 * self._stripes * (1 + self._stripe_slots)]
+        self._words = self._view.cast("Q")
+        self._stripe_bits = self._stripes.bit_length() - 1
+        self._limit = self._stripe_slots * 3 // 4
+        self._hasher = hashlib.blake2b(key=key, digest_size=8)
+    
+    def _open(self, create: bool, size: int = 0) -> "shared_memory.SharedMemory":
+        try:
+            return shared_memory.SharedMemory(self.name, create=create, size=size, track=False)
+        except TypeError:
+            # Before Python 3.13 every attaching process registers the segment with
+            # its resource tracker, which would unlink it when that process exits
+            shm = shared_memory.SharedMemory(self.name, create=create, size=size)
+            resource_tracker.unregister(shm._name, "shared_memory")
+            self._untracked = True
+            return shm
+    
+    @contextmanager
+    def _locked(self, stripe: int):
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe + 1)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe + 1)
+    
+    def _lock(self, stripe: int) -> None:
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe + 1)
+    
+    def _unlock(self, stripe: int) -> None:
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe + 1)
+    
+    def _fingerprint(self, token: str) -> int:
+        hasher = self._hasher.copy()
+        hasher.update(token.encode("utf-8"))
+        return int.from_bytes(hasher.digest(), "little") or 1
+    
+    def _insert(self, stripe: int, fingerprint: int) -> bool:
+        """Insert into ``stripe`` (its lock held); False if already present."""
+        words, mask = self._words, self._stripe_slots - 1
+        base = self._stripes + stripe * self._stripe_slots
+        i = (fingerprint >> self._stripe_bits) & mask
+        while words[base + i]:
+            if words[base + i] == fingerprint:
+                return False
+            i = (i + 1) & mask
+        if words[stripe] >= self._limit:
+            raise OverflowError(f"shared token table '{self.name}' is full; recreate it with a larger capacity")
+        words[base + i] = fingerprint
+        words[stripe] += 1
+        return True
+    
+    def add(self, token: str) -> bool:
+        fingerprint = self._fingerprint(token)
+        stripe = fingerprint & (self._stripes - 1)
+        # Explicit lock/unlock: a context manager would double the cost of a check
+        self._lock(stripe)
+        try:
+            return self._insert(stripe, fingerprint)
+        finally:
+            self._unlock(stripe)
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        # Take each stripe's lock once per batch
+        by_stripe = {}
+        stripe_mask = self._stripes - 1
+        for i, token in enumerate(tokens):
+            fingerprint = self._fingerprint(token)
+            by_stripe.setdefault(fingerprint & stripe_mask, []).append((i, fingerprint))
+        rejected = []
+        for stripe, entries in by_stripe.items():
+            with self._locked(stripe):
+                rejected += [i for i, fingerprint in entries if not self._insert(stripe, fingerprint)]
+        rejected.sort()
+        return rejected
+    
+    def __contains__(self, token: str) -> bool:
+        fingerprint = self._fingerprint(token)
+        stripe = fingerprint & (self._stripes - 1)
+        words, mask = self._words, self._stripe_slots - 1
+        base = self._stripes + stripe * self._stripe_slots
+        i = (fingerprint >> self._stripe_bits) & mask
+        self._lock(stripe)
+        try:
+            while words[base + i]:
+                if words[base + i] == fingerprint:
+                    return True
+                i = (i + 1) & mask
+            return False
+        finally:
+            self._unlock(stripe)
+    
+    def __len__(self) -> int:
+        return sum(self._words[:self._stripes])
+    
+    def clear(self) -> None:
+        """Forget every token recorded by any process attached to the table."""
+        for stripe in range(self._stripes):
+            with self._locked(stripe):
+                base = self._stripes + stripe * self._stripe_slots
+                self._words[base:base + self._stripe_slots] = array("Q", bytes(8 * self._stripe_slots))
+                self._words[stripe] = 0
+    
+    def close(self) -> None:
+        """Detach from the segment (it stays available to other processes)."""
+        if getattr(self, "_words", None) is not None:
+            self._words.release()
+            self._view.release()
+            self._words = None
+        self._shm.close()
+        os.close(self._lock_fd)
+    
+    def unlink(self) -> None:
+        """Destroy the segment once no process needs it any more."""
+        if self._untracked:
+            # SharedMemory.unlink unregisters the segment from the tracker again
+            resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+        try:
+            os.unlink(os.path.join(tempfile.gettempdir(), f"fake-tokens-{self.name}.lock"))
+        except FileNotFoundError:
+            pass
+
+
+class StripedStore(UniquenessStore):
+    """
+    Thread-safe history split into ``stripes`` stores, each behind its own lock.
+    
+    A token's stripe is picked from its hash, so threads only wait for each
+    other when they touch the same stripe; ``add_many`` takes each stripe's
+    lock once per batch.
+    """
+    
+    def __init__(self, factory: Callable[[], UniquenessStore] = SetStore, stripes: int = 16):
+        """
+        Args:
+            factory: Creates the store behind each stripe
+            stripes: Number of stripes (a power of two)
+        """
+        if stripes < 1 or stripes & (stripes - 1):
+            raise ValueError("stripes must be a power of two")
+        self._stores = [factory() for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._mask = stripes - 1
+    
+    def add(self, token: str) -> bool:
+        stripe = hash(token) & self._mask
+        with self._locks[stripe]:
+            return self._stores[stripe].add(token)
+    
+    def add_many(self, tokens: List[str]) -> List[int]:
+        by_stripe = {}
+        mask = self._mask
+        for i, token in enumerate(tokens):
+            by_stripe.setdefault(hash(token) & mask, []).append(i)
+        rejected = []
+        for stripe, indices in by_stripe.items():
+            store = self._stores[stripe]
+            batch = [tokens[i] for i in indices]
+            with self._locks[stripe]:
+                duplicates = _add_many(store, batch)
+            rejected += [indices[j] for j in duplicates]
+        rejected.sort()
+        return rejected
+    
+    def __contains__(self, token: str) -> bool:
+        stripe = hash(token) & self._mask
+        with self._locks[stripe]:
+            return token in self._stores[stripe]
+    
+    def __len__(self) -> int:
+        return sum(len(store) for store in self._stores)
+    
+    def clear(self) -> None:
+        for lock, store in zip(self._locks, self._stores):
+            with lock:
+                store.clear()
+
+
+def _collision_bound(untracked: int, recorded: int, space: int) -> float:
+    """Birthday bound on a collision involving any of ``untracked`` unchecked tokens."""
+    return (untracked * (untracked - 1) // 2 + untracked * recorded) / space
+
+
+class _RefillSignal:
+    """
+    Refill requests shared by a prefetching generator and its refill thread.
+    
+    The thread holds the generator only through a weak reference and waits on
+    this object instead, so a dropped generator is collected and its thread exits.
+    """
+    
+    def __init__(self):
+        self.wanted = threading.Condition()
+        self.queue = set()
+        self.stopped = False
+    
+    def stop(self) -> None:
+        with self.wanted:
+            self.stopped = True
+            self.wanted.notify_all()
+
+
+def _refill_loop(ref: "weakref.ref", signal: _RefillSignal) -> None:
+    """Background thread: top up the ready pools that asked for it, in bulk, until stopped."""
+    while True:
+        with signal.wanted:
+            while not signal.queue and not signal.stopped:
+                signal.wanted.wait()
+            if signal.stopped:
+                return
+            compiled = next(iter(signal.queue))
+        generator = ref()
+        if generator is None:
+            return
+        try:
+            generator._refill(compiled)
+        except Exception as e:
+            # Recorded rather than raised: the next request that runs low retries
+            with generator._lock:
+                generator._ready_stats["errors"] += 1
+            generator.refill_error = e
+        finally:
+            del generator
+            with signal.wanted:
+                signal.queue.discard(compiled)
 
 
 class TestTokenGenerator:
@@ -36,10 +1512,183 @@ class TestTokenGenerator:
     TOKEN_CHARS = string.ascii_letters + string.digits
     NPM_TOKEN_CHARS = string.ascii_letters + string.digits + "_-"  # NPM allows underscores and hyphens
     AWS_SECRET_CHARS = string.ascii_letters + string.digits + "+/"  # Base64-like characters
+    AWS_ACCESS_KEY_CHARS = string.ascii_uppercase + string.digits
     
-    def __init__(self):
-        """Initialize the token generator."""
-        self.generated_tokens = set()
+    def __init__(self, uniqueness: str = "compact", shard_id: Optional[int] = None,
+                 shard_count: Optional[int] = None, shard_counter_bits: int = 40,
+                 key: Optional[bytes] = None, store: Optional[UniquenessStore] = None,
+                 capacity: Optional[int] = None, fp_rate: float = 1e-6,
+                 collision_threshold: Union[float, str, None] = "auto", thread_safe: bool = False,
+                 seed: Optional[Union[int, str, bytes]] = None, prefetch: bool = False,
+                 low_watermark: int = DEFAULT_LOW_WATERMARK, high_watermark: int = DEFAULT_HIGH_WATERMARK):
+        """
+        Initialize the token generator.
+        
+        Args:
+            uniqueness: How tokens are kept unique. "compact" remembers a fingerprint
+                of every token in ``generated_tokens`` (a ``CompactStore``); "set"
+                remembers the full strings (a ``SetStore``); "bloom" uses a
+                fixed-size ``BloomStore`` that occasionally rejects (and
+                regenerates) a new token. "shard" encodes ``shard_id`` and a per-shard
+                counter into every token, so generators with different shard ids
+                never collide and no history is kept. "counter" maps a per-type
+                counter through a keyed permutation of the body space, which is
+                unique by construction and keeps no history either.
+            shard_id: This generator's shard, in ``range(shard_count)`` (shard mode)
+            shard_count: Total number of shards (shard mode)
+            shard_counter_bits: Size of the per-shard, per-type counter (shard mode)
+            key: Permutation key (counter mode, default: random). Generators sharing
+                a key produce the same sequence.
+            store: Custom ``UniquenessStore`` to use as history instead of the
+                default store of ``uniqueness``
+            capacity: Expected number of tokens; sizes the "compact" and "bloom" stores
+            fp_rate: False-positive rate of the "bloom" store at ``capacity`` tokens
+            collision_threshold: Tokens of a type are not recorded in the history
+                while the birthday bound on any collision among them stays at or
+                below this probability (see ``collision_bound``); None records
+                every token. "auto" (the default) is ``DEFAULT_COLLISION_THRESHOLD``,
+                or None when ``store`` is given: an explicit store is usually shared
+                with other generators or runs, which only see recorded tokens
+            thread_safe: Allow one generator to be shared by many threads: each
+                thread draws from its own entropy pool and the history becomes a
+                ``StripedStore`` (a custom ``store`` is put behind a single lock)
+            seed: Make the output reproducible: the same seed and sequence of
+                calls always yield the same tokens. Random bytes come from a
+                SHAKE-256 stream of the seed instead of ``os.urandom``, and the
+                counter-mode key defaults to one derived from the seed.
+            prefetch: Serve single tokens (``generate_*``, ``generate_token``) from
+                per-type pools of ready, already-recorded tokens, refilled in bulk by a
+                background thread; implies ``thread_safe``. See ``ready_pool_stats``.
+            low_watermark: Ready tokens of a type below which a refill is started (prefetch)
+            high_watermark: Ready tokens of a type a refill tops up to (prefetch)
+        """
+        if uniqueness not in ("compact", "set", "bloom", "shard", "counter"):
+            raise ValueError("uniqueness must be 'compact', 'set', 'bloom', 'shard' or 'counter'")
+        if uniqueness == "shard":
+            if shard_id is None or shard_count is None or not 0 <= shard_id < shard_count:
+                raise ValueError("shard mode requires 0 <= shard_id < shard_count")
+        if prefetch:
+            if not 0 <= low_watermark < high_watermark:
+                raise ValueError("prefetch requires 0 <= low_watermark < high_watermark")
+            # The refill thread shares the history and counters with callers
+            thread_safe = True
+        if seed is not None and thread_safe:
+            raise ValueError("seed cannot be combined with thread_safe or prefetch; "
+                             "thread scheduling would change the output")
+        seed = _seed_bytes(seed) if seed is not None else None
+        self.uniqueness = uniqueness
+        # Shard and counter modes are unique by construction and keep no history
+        self._tracked = uniqueness not in ("shard", "counter")
+        stripes = 16 if thread_safe else 1
+        if store is not None:
+            self.generated_tokens = StripedStore(lambda: store, 1) if thread_safe else store
+        elif uniqueness == "bloom":
+            # A seeded generator also needs reproducible false positives
+            bloom_key = _derive_key(seed, "bloom") if seed is not None else None
+            factory = lambda: BloomStore(-(-(capacity or 1000000) // stripes), fp_rate, bloom_key)
+        elif uniqueness == "compact":
+            # Seeded: keyed fingerprints are reproducible and can be checkpointed
+            compact_key = _derive_key(seed, "compact") if seed is not None else None
+            factory = lambda: CompactStore(-(-(capacity or 1024) // stripes), key=compact_key)
+        else:
+            factory = SetStore
+        if store is None:
+            self.generated_tokens = StripedStore(factory, stripes) if thread_safe else factory()
+        self.thread_safe = thread_safe
+        if collision_threshold == "auto":
+            collision_threshold = None if store is not None else DEFAULT_COLLISION_THRESHOLD
+        self.collision_threshold = collision_threshold
+        # Guards the bookkeeping below (and shard/counter positions) when thread_safe
+        self._lock = threading.Lock() if thread_safe else nullcontext()
+        # Per compiled spec: tokens emitted without recording them, and tokens recorded
+        self._untracked = {}
+        self._recorded = {}
+        # Per compiled spec: the untracked tokens themselves, while the type may still switch to tracking
+        self._kept = {}
+        self.seed = seed
+        if seed is not None:
+            self._pool = _EntropyPool(_SeededSource(seed))
+        else:
+            self._pool = _ThreadLocalEntropyPool() if thread_safe else _EntropyPool()
+        self._shard = (shard_id, shard_count, shard_counter_bits)
+        if key is None:
+            key = _derive_key(seed, "counter") if seed is not None else secrets.token_bytes(32)
+        self._key = key
+        self._encoders = {}
+        # Prefetch: ready tokens per compiled spec, and the specs waiting for a refill
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self._ready = {} if prefetch else None
+        # Held by a refill from recording a batch until it is pooled, so
+        # clear_history never drops the counts of tokens still to be pooled
+        self._refill_lock = threading.Lock()
+        self._refill_signal = _RefillSignal()
+        self._refill_thread = None
+        self._ready_stats = {"hits": 0, "misses": 0, "refills": 0, "errors": 0}
+        # Last exception raised by a background refill, if any
+        self.refill_error = None
+        if prefetch:
+            weakref.finalize(self, self._refill_signal.stop)
+    
+    def _encoder(self, compiled: _CompiledSpec):
+        """Return this generator's shard or counter encoder for ``compiled``."""
+        encoder = self._encoders.get(compiled)
+        if encoder is None:
+            if self.uniqueness == "shard":
+                encoder = _ShardEncoder(compiled, *self._shard)
+            else:
+                encoder = _CounterEncoder(compiled, self._key)
+            self._encoders[compiled] = encoder
+        return encoder
+    
+    def _batch(self, compiled: _CompiledSpec, count: int) -> List[str]:
+        """Generate ``count`` tokens without touching the history."""
+        if self.uniqueness == "counter":
+            # Only claiming the range needs the lock; the permutation runs outside it
+            return self._encoder(compiled).tokens(self._reserve(compiled, count), count)
+        if self.uniqueness == "shard":
+            with self._lock:
+                return self._encoder(compiled).batch(self._pool, count)
+        return compiled.batch(self._pool, count)
+    
+    def _reserve(self, compiled: _CompiledSpec, count: int) -> int:
+        """Claim ``count`` consecutive counter values of ``compiled`` (counter mode)."""
+        with self._lock:
+            return self._encoder(compiled).reserve(count)
+    
+    def _generate(self, compiled: _CompiledSpec, ensure_unique: bool = True) -> str:
+        """Generate one token from a compiled spec, retrying until it is new if requested."""
+        if self._ready is not None and ensure_unique:
+            token = self._take_ready(compiled)
+            if token is not None:
+                return token
+        return self._generate_direct(compiled, ensure_unique)
+    
+    def _generate_direct(self, compiled: _CompiledSpec, ensure_unique: bool = True) -> str:
+        """Generate one token now, bypassing the ready pools."""
+        if not self._tracked:
+            return self._batch(compiled, 1)[0]
+        token = compiled(self._pool)
+        if ensure_unique and self._skip_tracking(compiled, 1, [token]):
+            return token
+        return self._generate_tracked(compiled, ensure_unique, token)
+    
+    def _generate_tracked(self, compiled: _CompiledSpec, ensure_unique: bool = True,
+                          token: Optional[str] = None) -> str:
+        """Generate one token (starting from ``token`` if given), checking and recording it if ``ensure_unique``."""
+        for _ in range(MAX_RETRIES):
+            if token is None:
+                token = compiled(self._pool)
+            
+            if not ensure_unique:
+                return token
+            if self.generated_tokens.add(token):
+                with self._lock:
+                    self._recorded[compiled] = self._recorded.get(compiled, 0) + 1
+                return token
+            token = None
+        raise RuntimeError(f"no new '{compiled.spec.name}' token after {MAX_RETRIES} attempts; "
+                           "the token space or the uniqueness store is exhausted")
     
     def generate_github_classic_token(self, ensure_unique: bool = True) -> str:
         """
@@ -51,161 +1700,1450 @@ class TestTokenGenerator:
         Returns:
             A fake token string starting with 'ghp_'
         """
-        while True:
-            # Classic tokens have 36 characters after the prefix
-            token_body = ''.join(secrets.choice(self.TOKEN_CHARS) for _ in range(36))
-            token = f"{self.GITHUB_CLASSIC_PREFIX}{token_body}"
+        return self._generate(_compile_spec(TOKEN_SPECS["github_classic"]), ensure_unique)
+    
+    def generate_github_fine_grained_token(self, length: int = 93, ensure_unique: bool = True) -> str:
+        """
+        Generate a fake fine-grained GitHub personal access token.
+        
+        Args:
+            length: Total length of the token (default 93 is common)
+            ensure_unique: If True, ensures the token hasn't been generated before
             
-            if not ensure_unique or token not in self.generated_tokens:
-                if ensure_unique:
-                    self.generated_tokens.add(token)
-                return token
+        Returns:
+            A fake token starting with 'github_pat_'
+        """
+        if length < len(self.GITHUB_FINE_GRAINED_PREFIX) + 10:
+            raise ValueError(f"Token length must be at least {len(self.GITHUB_FINE_GRAINED_PREFIX) + 10}")
+        
+        spec = TOKEN_SPECS["github_fine_grained"]._replace(length=length - len(self.GITHUB_FINE_GRAINED_PREFIX))
+        return self._generate(_compile_spec(spec), ensure_unique)
+    
+    def generate_gitlab_token(self, ensure_unique: bool = True) -> str:
+        """
+        Generate a fake GitLab personal access token.
+        
+        Args:
+            ensure_unique: If True, ensures the token hasn't been generated before
+            
+        Returns:
+            A fake token string starting with 'glpat-'
+        """
+        return self._generate(_compile_spec(TOKEN_SPECS["gitlab"]), ensure_unique)
+    
+    def generate_aws_access_key(self, ensure_unique: bool = True) -> str:
+        """
+        Generate a fake AWS access key ID.
+        
+        Args:
+            ensure_unique: If True, ensures the token hasn't been generated before
+            
+        Returns:
+            A fake AWS access key starting with 'AKIA'
+        """
+        return self._generate(_compile_spec(TOKEN_SPECS["aws_access_key"]), ensure_unique)
+    
+    def generate_aws_secret_key(self, ensure_unique: bool = True) -> str:
+        """
+        Generate a fake AWS secret access key.
+        
+        Args:
+            ensure_unique: If True, ensures the token hasn't been generated before
+            
+        Returns:
+            A fake AWS secret key (40 characters, base64-like)
+        """
+        return self._generate(_compile_spec(TOKEN_SPECS["aws_secret_key"]), ensure_unique)
+    
+    def generate_npm_token(self, ensure_unique: bool = True) -> str:
+        """
+        Generate a fake NPM access token.
+        
+        Args:
+            ensure_unique: If True, ensures the token hasn't been generated before
+            
+        Returns:
+            A fake token string starting with 'npm_'
+        """
+        return self._generate(_compile_spec(TOKEN_SPECS["npm"]), ensure_unique)
+    
+    def generate_token(self, token_type: Union[str, "TokenType"] = "github_classic",
+                       ensure_unique: bool = True) -> str:
+        """
+        Generate a single token of any registered type.
+        
+        Args:
+            token_type: A ``TokenType`` member or registered token type name
+            ensure_unique: If True, ensures the token hasn't been generated before
+            
+        Returns:
+            A fake token of the requested type
+        """
+        return self._generate(_resolve_token_type(token_type), ensure_unique)
+    
+    def generate_batch(self, count: int, token_type: Union[str, "TokenType"] = "github_classic",
+                       as_array: bool = False, workers: Optional[int] = None, ensure_unique: bool = True):
+        """
+        Generate multiple test tokens at once.
+        
+        The token type is resolved once and all bodies are drawn in a single pass.
+        
+        Args:
+            count: Number of tokens to generate
+            token_type: A ``TokenType`` member or type name ("github_classic", "github_fine_grained", "gitlab", "npm", "aws_access_key", or "aws_secret_key")
+            as_array: If True, return a NumPy fixed-width bytes (``S``) array instead of a list (requires NumPy)
+            workers: If greater than 1, split generation across that many worker processes
+            ensure_unique: If True, ensures no token has been generated before; if False,
+                the tokens are neither checked against nor recorded in the history
+            
+        Returns:
+            List of generated tokens, or a NumPy ``S``-dtype array when ``as_array`` is True
+        """
+        compiled = _resolve_token_type(token_type)
+        
+        if as_array and np is None:
+            raise ImportError("as_array=True requires NumPy")
+        if workers is not None and workers > 1:
+            if not ensure_unique:
+                raise ValueError("workers can only be combined with ensure_unique=True")
+            tokens = [token for batch in self.iter_tokens(token_type, count, chunks=True, workers=workers)
+                      for token in batch]
+        elif as_array and self._tracked and ensure_unique:
+            return self._generate_batch_numpy(compiled, count, as_array)
+        else:
+            tokens = self._batch(compiled, count)
+            if ensure_unique:
+                tokens = self._accept_batch(compiled, tokens)
+        
+        return np.array(tokens, dtype="S%d" % compiled.width) if as_array else tokens
+    
+    def generate_many(self, counts: Dict[Union[str, "TokenType"], int]) -> Dict[Union[str, "TokenType"], List[str]]:
+        """
+        Generate tokens of several types in one call, e.g. ``{"github_classic": 3, "npm": 1}``.
+        
+        Every type is resolved before anything is generated, so a bad type or
+        count fails the whole request; the batches are then drawn back to back
+        from the generator's shared entropy buffer.
+        
+        Args:
+            counts: Mapping of token type (``TokenType`` member or registered name) to number of tokens
+            
+        Returns:
+            Dict with the same keys as ``counts``, each mapped to its list of tokens
+        """
+        requests = []
+        for token_type, count in counts.items():
+            if not isinstance(count, int) or count < 0:
+                raise ValueError(f"count for {token_type!r} must be a non-negative integer")
+            requests.append((token_type, _resolve_token_type(token_type), count))
+        
+        return {token_type: self._accept_batch(compiled, self._batch(compiled, count))
+                for token_type, compiled, count in requests}
+    
+    def iter_tokens(self, token_type: Union[str, "TokenType"] = "github_classic", count: Optional[int] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, chunks: bool = False,
+                    workers: Optional[int] = None) -> Iterator:
+        """
+        Lazily generate tokens, ``chunk_size`` at a time.
+        
+        Only a bounded number of chunks is held in memory, so arbitrarily large (or
+        endless) streams can be consumed without materializing them.
+        
+        Args:
+            token_type: A ``TokenType`` member or registered token type name
+            count: Number of tokens to generate, or None for an infinite stream
+            chunk_size: Number of tokens generated per internal batch
+            chunks: If True, yield lists of up to ``chunk_size`` tokens instead of single tokens
+            workers: If greater than 1, generate chunks in that many worker processes
+            
+        Yields:
+            Tokens, or lists of tokens when ``chunks`` is True
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        compiled = _resolve_token_type(token_type)
+        sizes = _chunk_sizes(count, chunk_size)
+        if workers is not None and workers > 1:
+            batches = (_split_packed(packed) for packed in _parallel_batches(self._worker_tasks(compiled, sizes),
+                                                                             workers))
+        else:
+            batches = (self._batch(compiled, size) for size in sizes)
+        
+        # Uniqueness is always checked here, against this generator's history,
+        # so it holds across worker processes too
+        for batch in batches:
+            batch = self._accept_batch(compiled, batch)
+            if chunks:
+                yield batch
+            else:
+                yield from batch
+    
+    def _iter_packed(self, token_type: Union[str, "TokenType"], count: int,
+                     workers: Optional[int] = None) -> Iterator[Union[List[str], bytes]]:
+        """
+        ``iter_tokens(..., chunks=True)`` for ``write_tokens``.
+        
+        Chunks from worker processes that bypass the history are yielded as the
+        packed bytes the workers returned (plus the final newline), so they are
+        never split into str only to be joined and encoded again.
+        """
+        if workers is None or workers <= 1:
+            yield from self.iter_tokens(token_type, count, chunks=True)
+            return
+        compiled = _resolve_token_type(token_type)
+        # Tokens are fixed-width, so a packed chunk's size follows from its length
+        line = compiled.width + 1
+        for packed in _parallel_batches(self._worker_tasks(compiled, _chunk_sizes(count, DEFAULT_CHUNK_SIZE)),
+                                        workers):
+            decode = partial(_split_packed, packed)
+            batch = self._accept_batch(compiled, decode, count=(len(packed) + 1) // line)
+            yield packed + b"\n" if batch is decode else batch
+    
+    def _worker_tasks(self, compiled: _CompiledSpec, sizes: Iterable[int]) -> Iterator[tuple]:
+        """Return the ``_generate_packed`` tasks generating chunks of ``sizes`` for this generator."""
+        if self.uniqueness == "shard":
+            raise ValueError("workers are not supported in shard mode; give each process its own shard_id instead")
+        if self.seed is not None and self.uniqueness != "counter":
+            raise ValueError("workers are only supported with a seed in counter mode, where tokens don't depend on the worker")
+        try:
+            pickle.dumps(_generate_packed)
+        except pickle.PicklingError:
+            raise ValueError(f"workers need this module importable as {__name__!r}: run fake-tokens.py as a "
+                             f"script, or add the module to sys.modules before executing it") from None
+        if self.uniqueness == "counter":
+            # Workers evaluate disjoint counter ranges, so they can't collide
+            return ((compiled.spec, size, self._key, self._reserve(compiled, size)) for size in sizes)
+        return ((compiled.spec, size) for size in sizes)
+    
+    def _generate_batch_numpy(self, compiled: _CompiledSpec, count: int, as_array: bool = False):
+        """
+        Vectorized ``generate_batch``: build ``count`` fixed-width token rows in one pass.
+        
+        Args:
+            compiled: Compiled spec of the token type
+            count: Number of tokens to generate
+            as_array: If True, return the ``S``-dtype array instead of a list of str
+        """
+        array = compiled.batch_array(self._pool, count)
+        width = compiled.width
+        
+        def decode() -> List[str]:
+            flat = array.tobytes().decode("ascii")
+            return [flat[i:i + width] for i in range(0, len(flat), width)]
+        
+        # An array batch that bypasses the history is never decoded
+        tokens = self._accept_batch(compiled, decode if as_array else decode(), array, count)
+        
+        return array if as_array else tokens
+    
+    def _accept_batch(self, compiled: _CompiledSpec, tokens: Union[List[str], Callable[[], List[str]]],
+                      array=None, count: Optional[int] = None) -> Union[List[str], Callable[[], List[str]]]:
+        """
+        Record a freshly generated batch in the history.
+        
+        The whole batch is checked against the history in one ``add_many`` call;
+        only the duplicates it reports (within the batch or against history) are
+        regenerated, in ``array`` as well when the batch is backed by a NumPy array.
+        
+        Args:
+            compiled: Compiled spec of the batch's token type
+            tokens: The batch, or (with ``count``) a function decoding it, called only if needed
+            array: NumPy ``S``-dtype array backing the batch, if any
+            count: Number of tokens in the batch, required when ``tokens`` is a function
+        
+        Returns:
+            The accepted batch; ``tokens`` itself when it bypassed the history
+        """
+        if count is None:
+            count = len(tokens)
+        if not self._tracked or self._skip_tracking(compiled, count, tokens):
+            return tokens
+        if callable(tokens):
+            tokens = tokens()
+        rejected = _add_many(self.generated_tokens, tokens)
+        with self._lock:
+            self._recorded[compiled] = self._recorded.get(compiled, 0) + len(tokens) - len(rejected)
+        for i in rejected:
+            tokens[i] = self._generate_tracked(compiled)
+            if array is not None:
+                array[i] = tokens[i].encode("ascii")
+        return tokens
+    
+    def _skip_tracking(self, compiled: _CompiledSpec, count: int,
+                       tokens: Union[List[str], Callable[[], List[str]]]) -> bool:
+        """
+        Decide whether ``count`` more tokens (``tokens``, or a function returning them) can bypass the history.
+        
+        Skipping is allowed while the bound from ``_collision_bound`` with the
+        extra tokens stays at or below ``collision_threshold``; the tokens are
+        then counted as untracked. Once a type switches to tracking, tokens it
+        skipped earlier would never be checked again, so unless its space is
+        too large for any run to reach the threshold (``UNREACHABLE_TOKEN_COUNT``),
+        the skipped tokens are kept and written to the history at the switch.
+        At most ``MAX_KEPT_UNTRACKED`` are kept: past that the type switches early.
+        """
+        threshold = self.collision_threshold
+        if threshold is None:
+            return False
+        with self._lock:
+            untracked = self._untracked.get(compiled, 0) + count
+            if _collision_bound(untracked, self._recorded.get(compiled, 0), compiled.space) <= threshold:
+                if _collision_bound(UNREACHABLE_TOKEN_COUNT, 0, compiled.space) <= threshold:
+                    self._untracked[compiled] = untracked
+                    return True
+                if untracked <= MAX_KEPT_UNTRACKED:
+                    self._kept.setdefault(compiled, []).extend(tokens() if callable(tokens) else tokens)
+                    self._untracked[compiled] = untracked
+                    return True
+            kept = self._kept.pop(compiled, None)
+        if kept:
+            self._record_kept(compiled, kept)
+        return False
+    
+    def _record_kept(self, compiled: _CompiledSpec, kept: List[str]) -> None:
+        """Write the skipped tokens of a type switching to tracking into the history."""
+        _add_many(self.generated_tokens, kept)
+        # They were handed out already, so they stay counted even in the
+        # (threshold-bounded) case that two of them collided
+        with self._lock:
+            self._untracked[compiled] -= len(kept)
+            self._recorded[compiled] = self._recorded.get(compiled, 0) + len(kept)
+    
+    def collision_bound(self, token_type: Union[str, "TokenType"] = "github_classic") -> float:
+        """
+        Upper bound on the probability that any token of this type emitted
+        without being recorded collides with another token of the type.
+        
+        With u untracked and t recorded tokens in a space of N bodies this is
+        the birthday bound (u*(u-1)/2 + u*t) / N; it is 0.0 when every token
+        was recorded (and so checked).
+        """
+        compiled = _resolve_token_type(token_type)
+        return _collision_bound(self._untracked.get(compiled, 0), self._recorded.get(compiled, 0), compiled.space)
+    
+    def _take_ready(self, compiled: _CompiledSpec) -> Optional[str]:
+        """Pop a ready token of ``compiled``, or return None on a miss; start a refill when running low."""
+        ready = self._ready.get(compiled)
+        if ready is None:
+            with self._lock:
+                ready = self._ready.setdefault(compiled, deque())
+        try:
+            token = ready.popleft()
+        except IndexError:
+            token = None
+        with self._lock:
+            self._ready_stats["hits" if token is not None else "misses"] += 1
+        if len(ready) < self.low_watermark:
+            self._request_refill(compiled)
+        return token
+    
+    def _request_refill(self, compiled: _CompiledSpec) -> None:
+        signal = self._refill_signal
+        with signal.wanted:
+            if signal.stopped:
+                return
+            if self._refill_thread is None:
+                self._refill_thread = threading.Thread(target=_refill_loop, args=(weakref.ref(self), signal),
+                                                       name="fake-tokens-refill", daemon=True)
+                self._refill_thread.start()
+            if compiled not in signal.queue:
+                signal.queue.add(compiled)
+                signal.wanted.notify()
+    
+    def _refill(self, compiled: _CompiledSpec) -> None:
+        """Top up the ready pool of ``compiled`` to the high watermark."""
+        with self._lock:
+            ready = self._ready.setdefault(compiled, deque())
+        while len(ready) < self.high_watermark:
+            size = min(self.high_watermark - len(ready), DEFAULT_CHUNK_SIZE)
+            with self._refill_lock:
+                ready.extend(self._accept_batch(compiled, self._batch(compiled, size)))
+        with self._lock:
+            self._ready_stats["refills"] += 1
+    
+    def prefill(self, token_type: Union[str, "TokenType"] = "github_classic") -> None:
+        """
+        Fill the ready pool of a token type to the high watermark now (prefetch),
+        so even the first request is a hit.
+        
+        Args:
+            token_type: A ``TokenType`` member or registered token type name
+        """
+        if self._ready is None:
+            raise ValueError("prefill requires prefetch=True")
+        self._refill(_resolve_token_type(token_type))
+    
+    def ready_pool_stats(self) -> Dict[str, int]:
+        """
+        Counters of the prefetch ready pools.
+        
+        Returns:
+            Dict with "hits" and "misses" (single-token requests served from, or
+            missing, a ready pool), "refills" (completed top-ups), "errors"
+            (background refills that raised; the last one is ``refill_error``)
+            and "ready" (tokens currently waiting in the pools)
+        """
+        with self._lock:
+            stats = dict(self._ready_stats)
+        stats["ready"] = sum(len(ready) for ready in (self._ready or {}).values())
+        return stats
+    
+    def close(self) -> None:
+        """
+        Stop the background refill thread of a prefetching generator.
+        
+        Tokens already in the ready pools are still handed out; after that,
+        tokens are generated on demand.
+        """
+        self._refill_signal.stop()
+        thread = self._refill_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+    
+    def __enter__(self) -> "TestTokenGenerator":
+        return self
     
-    def generate_github_fine_grained_token(self, length: int = 93, ensure_unique: bool = True) -> str:
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def clear_history(self):
+        """Clear the history of generated tokens (shard and counter positions are never reset)."""
+        with self._refill_lock:
+            self.generated_tokens.clear()
+            with self._lock:
+                self._untracked.clear()
+                self._recorded.clear()
+                self._kept.clear()
+                # Ready tokens were counted as recorded; drop them with the history
+                for ready in (self._ready or {}).values():
+                    ready.clear()
+    
+    def get_generated_count(self) -> int:
+        """Get the number of unique tokens generated so far."""
+        # Tokens waiting in the ready pools have not been handed out yet
+        waiting = sum(len(ready) for ready in (self._ready or {}).values())
+        if not self._tracked:
+            return sum(encoder.counter for encoder in self._encoders.values()) - waiting
+        # Counted here rather than by len(store): stores may evict or be shared
+        return sum(self._recorded.values()) + sum(self._untracked.values()) - waiting
+    
+    def getstate(self) -> dict:
         """
-        Generate a fake fine-grained GitHub personal access token.
+        Capture the state of a seeded generator, for ``setstate`` in another process.
+        
+        The state holds the position in the seeded stream, the shard/counter
+        positions, the uniqueness bookkeeping (keyed by token type name, so
+        custom types must be registered again before ``setstate``) and the
+        history store itself, so it is picklable as long as the store is.
         
-        Args:
-            length: Total length of the token (default 93 is common)
-            ensure_unique: If True, ensures the token hasn't been generated before
-            
         Returns:
-            A fake token starting with 'github_pat_'
+            A picklable dict
         """
-        if length < len(self.GITHUB_FINE_GRAINED_PREFIX) + 10:
-            raise ValueError(f"Token length must be at least {len(self.GITHUB_FINE_GRAINED_PREFIX) + 10}")
-        
-        while True:
-            # Calculate body length after removing prefix
-            body_length = length - len(self.GITHUB_FINE_GRAINED_PREFIX)
-            token_body = ''.join(secrets.choice(self.TOKEN_CHARS) for _ in range(body_length))
-            token = f"{self.GITHUB_FINE_GRAINED_PREFIX}{token_body}"
-            
-            if not ensure_unique or token not in self.generated_tokens:
-                if ensure_unique:
-                    self.generated_tokens.add(token)
-                return token
+        if self.seed is None:
+            raise ValueError("only seeded generators have a reproducible state")
+        return {
+            "seed": self.seed,
+            "uniqueness": self.uniqueness,
+            "key": self._key,
+            "stream": self._pool.getstate(),
+            "encoders": {compiled.spec.name: encoder.counter for compiled, encoder in self._encoders.items()},
+            "untracked": {compiled.spec.name: count for compiled, count in self._untracked.items()},
+            "recorded": {compiled.spec.name: count for compiled, count in self._recorded.items()},
+            "kept": {compiled.spec.name: list(tokens) for compiled, tokens in self._kept.items()},
+            "store": self.generated_tokens,
+        }
     
-    def generate_gitlab_token(self, ensure_unique: bool = True) -> str:
+    def setstate(self, state: dict) -> None:
         """
-        Generate a fake GitLab personal access token.
+        Continue exactly where the generator that produced ``state`` (see ``getstate``) was.
         
         Args:
-            ensure_unique: If True, ensures the token hasn't been generated before
-            
-        Returns:
-            A fake token string starting with 'glpat-'
+            state: A state from a generator with the same seed and uniqueness mode
         """
-        while True:
-            # GitLab tokens have 20 characters after the prefix (26 total)
-            token_body = ''.join(secrets.choice(self.TOKEN_CHARS) for _ in range(20))
-            token = f"{self.GITLAB_PREFIX}{token_body}"
-            
-            if not ensure_unique or token not in self.generated_tokens:
-                if ensure_unique:
-                    self.generated_tokens.add(token)
-                return token
+        if state["seed"] != self.seed or state["uniqueness"] != self.uniqueness:
+            raise ValueError("state belongs to a generator with a different seed or uniqueness mode")
+        self._key = state["key"]
+        self._pool.setstate(state["stream"])
+        self._encoders = {}
+        for name, counter in state["encoders"].items():
+            self._encoder(_resolve_token_type(name)).counter = counter
+        self._untracked = {_resolve_token_type(name): count for name, count in state["untracked"].items()}
+        self._recorded = {_resolve_token_type(name): count for name, count in state["recorded"].items()}
+        self._kept = {_resolve_token_type(name): list(tokens) for name, tokens in state["kept"].items()}
+        self.generated_tokens = state["store"]
+
+
+# Registry of token formats, keyed by token type name
+TOKEN_SPECS = {}  # type: Dict[str, TokenSpec]
+
+
+def register_token_spec(spec: TokenSpec) -> None:
+    """
+    Add (or replace) a token format in the registry.
     
-    def generate_aws_access_key(self, ensure_unique: bool = True) -> str:
-        """
-        Generate a fake AWS access key ID.
+    The spec is compiled up front, so an invalid layout, alphabet or checksum
+    raises ``ValueError`` here rather than on first use. Type names are case-insensitive, so the name is stored in
+    lowercase.
+    """
+    spec = spec._replace(name=spec.name.lower())
+    _compile_spec(spec)
+    TOKEN_SPECS[spec.name] = spec
+
+
+def _token_type_error() -> str:
+    names = ["'%s'" % name for name in TOKEN_SPECS]
+    return "token_type must be %s, or %s" % (", ".join(names[:-1]), names[-1])
+
+
+class TokenType(str, Enum):
+    """Built-in token types; passing a member skips parsing the type name."""
+    GITHUB_CLASSIC = "github_classic"
+    GITHUB_FINE_GRAINED = "github_fine_grained"
+    GITLAB = "gitlab"
+    NPM = "npm"
+    AWS_ACCESS_KEY = "aws_access_key"
+    AWS_SECRET_KEY = "aws_secret_key"
+
+
+def _resolve_token_type(token_type: Union[str, TokenType]) -> _CompiledSpec:
+    """Resolve a ``TokenType`` member or type name to its compiled generator."""
+    if isinstance(token_type, TokenType):
+        return _compile_spec(TOKEN_SPECS[token_type.value])
+    spec = TOKEN_SPECS.get(token_type.lower())
+    if spec is None:
+        raise ValueError(_token_type_error())
+    return _compile_spec(spec)
+
+
+@lru_cache(maxsize=64)
+def _seeded_encoder(compiled: _CompiledSpec, seed: bytes) -> _CounterEncoder:
+    """Counter-mode encoder keyed the way ``TestTokenGenerator(uniqueness="counter", seed=seed)`` keys it."""
+    return _CounterEncoder(compiled, _derive_key(seed, "counter"))
+
+
+def token_at(token_type: Union[str, TokenType], seed: Union[int, str, bytes], index: int) -> str:
+    """
+    Compute the ``index``-th token of the virtual sequence for ``seed`` directly.
+    
+    The sequence is the one a seeded counter-mode generator produces
+    (``TestTokenGenerator(uniqueness="counter", seed=seed)``): a keyed
+    permutation of the counter, so the lookup costs the same for any index and
+    no two indices give the same token.
+    
+    Args:
+        token_type: A ``TokenType`` member or registered token type name
+        seed: Sequence seed (an int, str or bytes)
+        index: Position in ``range(2 ** bits)`` of the type's counter space
         
+    Returns:
+        The token at ``index``
+    """
+    encoder = _seeded_encoder(_resolve_token_type(token_type), _seed_bytes(seed))
+    if not 0 <= index < 1 << encoder.bits:
+        raise IndexError(f"index must be in range(2 ** {encoder.bits})")
+    return encoder.token(index)
+
+
+class TokenSequence:
+    """
+    Lazy, read-only view of the seeded token sequence of ``token_at``.
+    
+    Supports ``len``, indexing (including negative indices), slicing (which
+    returns another view) and iteration, without storing any token, so
+    processes can each materialize a disjoint slice of one sequence
+    (``list(sequence[i * n:(i + 1) * n])``) with no coordination.
+    """
+    
+    def __init__(self, token_type: Union[str, TokenType], seed: Union[int, str, bytes],
+                 length: Optional[int] = None):
+        """
         Args:
-            ensure_unique: If True, ensures the token hasn't been generated before
-            
-        Returns:
-            A fake AWS access key starting with 'AKIA'
+            token_type: A ``TokenType`` member or registered token type name
+            seed: Sequence seed (an int, str or bytes)
+            length: Number of tokens in the view (default: the whole counter
+                space, capped at ``sys.maxsize`` so ``len`` works)
         """
+        self.token_type = token_type
+        self.seed = _seed_bytes(seed)
+        space = 1 << _seeded_encoder(_resolve_token_type(token_type), self.seed).bits
+        length = min(space, sys.maxsize) if length is None else length
+        if not 0 <= length <= space:
+            raise ValueError(f"length must be between 0 and {space}")
+        self._indices = range(length)
+    
+    @property
+    def _encoder(self) -> _CounterEncoder:
+        return _seeded_encoder(_resolve_token_type(self.token_type), self.seed)
+    
+    def __len__(self) -> int:
+        return len(self._indices)
+    
+    def __getitem__(self, item: Union[int, slice]) -> Union[str, "TokenSequence"]:
+        if isinstance(item, slice):
+            view = TokenSequence.__new__(TokenSequence)
+            view.token_type, view.seed, view._indices = self.token_type, self.seed, self._indices[item]
+            return view
+        return self._encoder.token(self._indices[item])
+    
+    def __iter__(self) -> Iterator[str]:
+        token = self._encoder.token
+        for index in self._indices:
+            yield token(index)
+    
+    def __repr__(self) -> str:
+        indices = self._indices
+        return f"TokenSequence({self.token_type!r}, range({indices.start}, {indices.stop}, {indices.step}))"
+
+
+for _spec in (
+    TokenSpec("github_classic", TestTokenGenerator.GITHUB_CLASSIC_PREFIX, TestTokenGenerator.TOKEN_CHARS, 36),
+    TokenSpec("github_fine_grained", TestTokenGenerator.GITHUB_FINE_GRAINED_PREFIX, TestTokenGenerator.TOKEN_CHARS,
+              93 - len(TestTokenGenerator.GITHUB_FINE_GRAINED_PREFIX)),
+    TokenSpec("gitlab", TestTokenGenerator.GITLAB_PREFIX, TestTokenGenerator.TOKEN_CHARS, 20),
+    TokenSpec("npm", TestTokenGenerator.NPM_PREFIX, TestTokenGenerator.NPM_TOKEN_CHARS, 36),
+    TokenSpec("aws_access_key", TestTokenGenerator.AWS_ACCESS_KEY_PREFIX, TestTokenGenerator.AWS_ACCESS_KEY_CHARS, 16),
+    TokenSpec("aws_secret_key", "", TestTokenGenerator.AWS_SECRET_CHARS, 40),
+):
+    register_token_spec(_spec)
+
+
+def _chunk_sizes(count: Optional[int], chunk_size: int) -> Iterator[int]:
+    """Split ``count`` (None: unbounded) into chunks of at most ``chunk_size``."""
+    remaining = count
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        if remaining is not None:
+            remaining -= size
+        yield size
+
+
+# Entropy pool of a worker process, created on first use so forked workers never share buffered bytes
+_worker_pool = None
+
+
+def _generate_packed(spec: TokenSpec, count: int, key: Optional[bytes] = None, start: int = 0) -> bytes:
+    """
+    Process-pool task: generate ``count`` tokens of ``spec`` as newline-separated ASCII bytes.
+    
+    With a ``key``, the tokens are counter-mode tokens ``start`` to ``start + count - 1``.
+    """
+    global _worker_pool
+    compiled = _compile_spec(spec)
+    if key is not None:
+        tokens = _CounterEncoder(compiled, key).tokens(start, count)
+    else:
+        if _worker_pool is None:
+            _worker_pool = _EntropyPool()
+        tokens = compiled.batch(_worker_pool, count)
+    return "\n".join(tokens).encode("ascii")
+
+
+def _parallel_batches(tasks: Iterable[tuple], workers: int) -> Iterator[bytes]:
+    """
+    Run ``_generate_packed`` tasks in a process pool, yielding their packed batches in submission order.
+    
+    Workers return packed bytes rather than pickled lists of str; at most
+    ``2 * workers`` tasks are in flight at a time.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(_generate_packed, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _split_packed(packed: bytes) -> List[str]:
+    """Split a batch packed by ``_generate_packed`` into its tokens."""
+    return packed.decode("ascii").split("\n")
+
+
+def write_tokens(chunks: Iterable[List[str]], stream: Optional[BinaryIO] = None,
+                 buffer_size: int = DEFAULT_OUTPUT_BUFFER_SIZE) -> None:
+    """
+    Write chunks of tokens, one per line, in large byte writes.
+    
+    Args:
+        chunks: Iterable of token lists (e.g. ``iter_tokens(..., chunks=True)``), or of
+            ``bytes`` already holding newline-terminated tokens
+        stream: Binary stream to write to (default: ``sys.stdout.buffer``)
+        buffer_size: Bytes collected before each write
+    """
+    if stream is None:
+        stream = sys.stdout.buffer
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        data = chunk if isinstance(chunk, bytes) else ("\n".join(chunk) + "\n").encode("ascii")
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= buffer_size:
+            stream.write(b"".join(pending))
+            pending = []
+            pending_size = 0
+    if pending:
+        stream.write(b"".join(pending))
+    stream.flush()
+
+
+def write_checkpointed(generator: "TestTokenGenerator", path: str, checkpoint: str, count: int,
+                       token_type: Union[str, "TokenType"] = "github_classic",
+                       every: int = DEFAULT_CHECKPOINT_INTERVAL, resume: bool = False) -> None:
+    """
+    Write ``count`` tokens to the file ``path``, checkpointing every ``every`` tokens.
+    
+    A checkpoint is saved when the run starts and after each ``every`` tokens
+    (rounded up to a whole chunk): the output is fsynced and the generator
+    state (see ``TestTokenGenerator.getstate``) is saved to ``checkpoint``
+    together with the number of tokens and bytes written, replacing the
+    previous checkpoint atomically. With ``resume``, the output is truncated
+    back to the last checkpoint and generation continues from its state, so
+    the finished file is byte-for-byte the one an uninterrupted run would have
+    written; without a checkpoint to resume from, the run starts over.
+    
+    Neither the history store nor the skipped tokens kept for it are saved in
+    checkpoints, which keeps each one small however long the run: the output
+    file already holds every token, so on resume the history is rebuilt by
+    recording the tokens written so far again, and the tokens that bypassed
+    it (see ``collision_threshold``) are read back from their ranges.
+    
+    Args:
+        generator: A seeded generator
+        path: Output file
+        checkpoint: Checkpoint file
+        count: Total number of tokens in the output
+        token_type: A ``TokenType`` member or registered token type name
+        every: Tokens written between checkpoints
+        resume: Continue from ``checkpoint`` instead of starting over
+    """
+    if generator.seed is None:
+        raise ValueError("checkpointing requires a seeded generator")
+    if every < 1:
+        raise ValueError("every must be at least 1")
+    compiled = _resolve_token_type(token_type)
+    name = compiled.spec.name
+    written = offset = 0
+    # [start, end) ranges of output tokens that bypassed the history
+    skipped = []
+    if resume:
+        try:
+            with open(checkpoint, "rb") as f:
+                saved = pickle.load(f)
+        except FileNotFoundError:
+            resume = False
+    if resume:
+        if (saved["token_type"], saved["count"]) != (name, count):
+            raise ValueError(f"{checkpoint} was written for {saved['count']} {saved['token_type']} tokens")
+        state = saved["generator"]
+        if (state["seed"], state["uniqueness"]) != (generator.seed, generator.uniqueness):
+            raise ValueError(f"{checkpoint} was written with a different seed or uniqueness mode")
+        state["store"] = generator.generated_tokens
+        generator.setstate(state)
+        written, offset, skipped = saved["written"], saved["offset"], saved["skipped"]
+        if generator._tracked:
+            _replay_history(generator, compiled, path, written, skipped)
+            if saved["kept"]:
+                generator._kept[compiled] = [token for start, end in skipped
+                                             for chunk in _read_tokens(compiled, path, start, end)
+                                             for token in chunk]
+    
+    def save() -> None:
+        state = generator.getstate()
+        state["store"] = None
+        # Every kept token lies in the skipped ranges: they are cleared whenever the kept ones are recorded
+        state["kept"] = {}
+        _save_checkpoint(checkpoint, output, {"token_type": name, "count": count, "written": written,
+                                              "skipped": skipped, "kept": compiled in generator._kept,
+                                              "generator": state})
+    
+    with open(path, "r+b" if resume else "wb") as output:
+        # Drop whatever the interrupted run wrote after its last checkpoint
+        output.truncate(offset)
+        output.seek(offset)
+        if not resume:
+            save()
+        # One stream of DEFAULT_CHUNK_SIZE chunks, as in an uninterrupted run: a
+        # batch's draw depends on its size, so checkpoints fall between chunks
+        # (the first boundary after every ``every`` tokens)
+        since_checkpoint = 0
+        untracked = generator._untracked.get(compiled, 0)
+        for chunk in generator.iter_tokens(token_type, count - written, chunks=True):
+            now = generator._untracked.get(compiled, 0)
+            if now < untracked:
+                # The type switched to tracking and recorded every token it had skipped
+                skipped.clear()
+            elif now > untracked:
+                # The whole chunk bypassed the history (see _skip_tracking)
+                if skipped and skipped[-1][1] == written:
+                    skipped[-1][1] += len(chunk)
+                else:
+                    skipped.append([written, written + len(chunk)])
+            untracked = now
+            output.write(("\n".join(chunk) + "\n").encode("ascii"))
+            written += len(chunk)
+            since_checkpoint += len(chunk)
+            if since_checkpoint >= every or written == count:
+                since_checkpoint = 0
+                save()
+
+
+def _replay_history(generator: "TestTokenGenerator", compiled: _CompiledSpec, path: str, written: int,
+                    skipped: List[List[int]]) -> None:
+    """Record the first ``written`` tokens of ``path`` again, except the ``skipped`` ranges."""
+    bounds = [0] + [bound for skip in skipped for bound in skip] + [written]
+    for start, end in zip(bounds[::2], bounds[1::2]):
+        for chunk in _read_tokens(compiled, path, start, end):
+            _add_many(generator.generated_tokens, chunk)
+
+
+def _read_tokens(compiled: _CompiledSpec, path: str, start: int, end: int) -> Iterator[List[str]]:
+    """Yield tokens ``start`` to ``end`` of the output file ``path`` in chunks."""
+    # Tokens are fixed-width lines, so any range can be read without scanning
+    line = compiled.width + 1
+    with open(path, "rb") as f:
+        for i in range(start, end, DEFAULT_CHUNK_SIZE):
+            f.seek(i * line)
+            yield f.read(min(DEFAULT_CHUNK_SIZE, end - i) * line).decode("ascii").split()
+
+
+def _save_checkpoint(checkpoint: str, output: BinaryIO, state: dict) -> None:
+    """Sync ``output`` and atomically replace ``checkpoint`` with ``state`` plus the output offset."""
+    output.flush()
+    os.fsync(output.fileno())
+    state["offset"] = output.tell()
+    with open(checkpoint + ".tmp", "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(checkpoint + ".tmp", checkpoint)
+
+
+# Token server protocol: every message is a 4-byte big-endian length and a payload.
+# A request payload is a UTF-8 JSON object {"type": ..., "count": ..., "ensure_unique": ...};
+# a response payload is b"+" and the tokens separated by newlines, or b"-" and an error message.
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def _read_frame(stream: BinaryIO) -> Optional[bytes]:
+    """Read one length-prefixed payload, or return None at a clean end of stream."""
+    header = stream.read(_FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _FRAME_HEADER.size:
+        raise ConnectionError("connection closed mid-frame")
+    (length,) = _FRAME_HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        raise ConnectionError("connection closed mid-frame")
+    return payload
+
+
+def _frame(payload: bytes) -> bytes:
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _answer(generator: "TestTokenGenerator", request: dict) -> List[str]:
+    """Validate a server request and return its tokens."""
+    count = request.get("count", 1)
+    if not isinstance(count, int) or not 1 <= count <= MAX_SERVE_COUNT:
+        raise ValueError(f"count must be an integer between 1 and {MAX_SERVE_COUNT}")
+    token_type = request.get("type", "github_classic")
+    if not isinstance(token_type, str):
+        raise ValueError(_token_type_error())
+    ensure_unique = bool(request.get("ensure_unique", True))
+    if count == 1:
+        return [generator.generate_token(token_type, ensure_unique)]
+    return generator.generate_batch(count, token_type, ensure_unique=ensure_unique)
+
+
+class _TokenRequestHandler(socketserver.StreamRequestHandler):
+    """Answer framed requests of one connection in order, as fast as they are pipelined."""
+    
+    def handle(self) -> None:
+        generator = self.server.generator
         while True:
-            # AWS access keys have 16 characters after AKIA prefix (20 total)
-            token_body = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(16))
-            token = f"{self.AWS_ACCESS_KEY_PREFIX}{token_body}"
-            
-            if not ensure_unique or token not in self.generated_tokens:
-                if ensure_unique:
-                    self.generated_tokens.add(token)
-                return token
+            try:
+                payload = _read_frame(self.rfile)
+            except ConnectionError:
+                return
+            if payload is None:
+                return
+            try:
+                tokens = _answer(generator, json.loads(payload))
+                response = b"+" + "\n".join(tokens).encode("ascii")
+            except (ValueError, TypeError, AttributeError, OverflowError, RuntimeError) as e:
+                response = b"-" + str(e).encode("utf-8")
+            try:
+                self.wfile.write(_frame(response))
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Unlink ``path`` if it is a Unix socket nobody listens on; raise if a server still does."""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        # bind() reports anything else as in use
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    except FileNotFoundError:
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, "another server is listening on this socket", path)
+
+
+class TokenServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Daemon serving tokens over a Unix socket from one warm ``TestTokenGenerator``.
     
-    def generate_aws_secret_key(self, ensure_unique: bool = True) -> str:
+    Every connection is handled in its own thread and shares the generator
+    (and so its uniqueness history); requests on a connection may be
+    pipelined and are answered in order. See ``TokenClient`` for the client.
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, path: str, generator: Optional["TestTokenGenerator"] = None):
         """
-        Generate a fake AWS secret access key.
-        
         Args:
-            ensure_unique: If True, ensures the token hasn't been generated before
-            
-        Returns:
-            A fake AWS secret key (40 characters, base64-like)
+            path: Socket path; a stale socket left there by a server that is no
+                longer running is replaced, anything else raises ``OSError`` (EADDRINUSE)
+            generator: Generator to serve from (default: a thread-safe one); it must be thread-safe
         """
-        while True:
-            # AWS secret keys are 40 characters, base64-like encoding
-            token = ''.join(secrets.choice(self.AWS_SECRET_CHARS) for _ in range(40))
-            
-            if not ensure_unique or token not in self.generated_tokens:
-                if ensure_unique:
-                    self.generated_tokens.add(token)
-                return token
+        if generator is None:
+            generator = TestTokenGenerator(thread_safe=True)
+        elif not generator.thread_safe:
+            raise ValueError("the served generator must be thread_safe")
+        self.generator = generator
+        self._bound = False
+        _remove_stale_socket(path)
+        super().__init__(path, _TokenRequestHandler)
     
-    def generate_npm_token(self, ensure_unique: bool = True) -> str:
+    def server_bind(self) -> None:
+        super().server_bind()
+        self._bound = True
+    
+    def server_close(self) -> None:
+        super().server_close()
+        # Only remove a socket this server created, never a file a failed bind found there
+        if self._bound:
+            try:
+                os.unlink(self.server_address)
+            except FileNotFoundError:
+                pass
+
+
+class TokenClient:
+    """
+    Thin client of a ``TokenServer`` (``fake-tokens.py serve --socket PATH``).
+    
+    ``tokens`` and ``token`` are request/response calls; to pipeline, call
+    ``send`` several times and then ``receive`` once per request, in order.
+    Past ``MAX_IN_FLIGHT`` unanswered requests, ``send`` first reads a response
+    into a local queue, so neither side's socket buffer can fill up and stall.
+    """
+    
+    MAX_IN_FLIGHT = 64
+    
+    def __init__(self, path: str):
         """
-        Generate a fake NPM access token.
-        
         Args:
-            ensure_unique: If True, ensures the token hasn't been generated before
-            
-        Returns:
-            A fake token string starting with 'npm_'
+            path: Socket path of the server
         """
-        while True:
-            # NPM tokens have 36 characters after the prefix
-            token_body = ''.join(secrets.choice(self.NPM_TOKEN_CHARS) for _ in range(36))
-            token = f"{self.NPM_PREFIX}{token_body}"
-            
-            if not ensure_unique or token not in self.generated_tokens:
-                if ensure_unique:
-                    self.generated_tokens.add(token)
-                return token
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._stream = self._socket.makefile("rb")
+        self._in_flight = 0
+        self._received = deque()
+    
+    def send(self, token_type: Union[str, "TokenType"] = "github_classic", count: int = 1,
+             ensure_unique: bool = True) -> None:
+        """Send a request without waiting for its response."""
+        if isinstance(token_type, TokenType):
+            token_type = token_type.value
+        request = {"type": token_type, "count": count, "ensure_unique": ensure_unique}
+        if self._in_flight >= self.MAX_IN_FLIGHT:
+            self._received.append(self._read_response())
+        self._socket.sendall(_frame(json.dumps(request).encode("utf-8")))
+        self._in_flight += 1
+    
+    def _read_response(self) -> bytes:
+        payload = _read_frame(self._stream)
+        if payload is None:
+            raise ConnectionError("server closed the connection")
+        self._in_flight -= 1
+        return payload
+    
+    def receive(self) -> List[str]:
+        """Return the tokens of the oldest request not yet received."""
+        payload = self._received.popleft() if self._received else self._read_response()
+        if payload[:1] != b"+":
+            raise ValueError(payload[1:].decode("utf-8"))
+        return payload[1:].decode("ascii").split("\n")
+    
+    def tokens(self, token_type: Union[str, "TokenType"] = "github_classic", count: int = 1) -> List[str]:
+        """Request ``count`` tokens of ``token_type``."""
+        self.send(token_type, count)
+        return self.receive()
+    
+    def token(self, token_type: Union[str, "TokenType"] = "github_classic") -> str:
+        """Request a single token of ``token_type``."""
+        return self.tokens(token_type)[0]
+    
+    def iter_chunks(self, token_type: Union[str, "TokenType"] = "github_classic", count: int = 1,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[str]]:
+        """Yield ``count`` tokens in lists of up to ``chunk_size``, keeping the next request in flight."""
+        in_flight = 0
+        for size in _chunk_sizes(count, min(chunk_size, MAX_SERVE_COUNT)):
+            self.send(token_type, size)
+            in_flight += 1
+            if in_flight > 1:
+                yield self.receive()
+                in_flight -= 1
+        for _ in range(in_flight):
+            yield self.receive()
+    
+    def close(self) -> None:
+        self._stream.close()
+        self._socket.close()
+    
+    def __enter__(self) -> "TokenClient":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def serve(argv: Optional[List[str]] = None) -> None:
+    """``fake-tokens.py serve``: run a ``TokenServer`` until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="fake-tokens.py serve",
+        description="Serve fake tokens over a Unix socket from one warm generator "
+                    "(fetch them with --socket, TokenClient, or the framed protocol)"
+    )
+    parser.add_argument("--socket", required=True, metavar="PATH", help="Unix socket path to listen on")
+    parser.add_argument("--uniqueness", choices=["compact", "set", "bloom", "counter"], default="compact",
+                        help="Uniqueness mode of the served generator (default: compact)")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Keep ready pools of tokens refilled in the background (see prefetch=)")
+    args = parser.parse_args(argv)
+    
+    generator = TestTokenGenerator(uniqueness=args.uniqueness, thread_safe=True, prefetch=args.prefetch)
+    try:
+        server = TokenServer(args.socket, generator)
+    except OSError as e:
+        parser.error(f"cannot listen on {args.socket}: {e.strerror}")
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+_HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                 413: "Payload Too Large"}
+
+
+class _StreamAborted(Exception):
+    """A chunked response failed after its headers were sent; the connection must be dropped."""
+
+
+class _HTTPError(Exception):
+    """An error answered with ``status`` and ``message`` as plain text."""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _CorkedWriter:
+    """
+    Coalesce everything written during one event-loop step into one socket send.
     
-    def generate_batch(self, count: int, token_type: str = "github_classic") -> List[str]:
+    Pipelined requests already in the read buffer are answered without yielding
+    to the loop, so their responses leave in a single write instead of one
+    system call each.
+    """
+    
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self._pending = []
+        self._loop = asyncio.get_event_loop()
+    
+    def write(self, data: bytes) -> None:
+        if not self._pending:
+            self._loop.call_soon(self.flush)
+        self._pending.append(data)
+    
+    def flush(self) -> None:
+        if self._pending:
+            self.writer.write(b"".join(self._pending))
+            self._pending.clear()
+    
+    async def drain(self) -> None:
+        self.flush()
+        await self.writer.drain()
+
+
+class TokenHTTPServer:
+    """
+    HTTP/1.1 token server on ``asyncio`` streams (stdlib only) around one warm generator.
+    
+    Endpoints:
+    
+    - ``GET /token/{type}[?count=N]``: N tokens (default 1), one per line
+    - ``POST /batch``: a JSON object of type -> count, answered with a JSON
+      object of type -> list of tokens
+    - ``GET /stream/{type}?count=N``: N tokens (any number) with chunked
+      transfer encoding, one chunk per batch, paced by the client
+    
+    Connections are kept alive (HTTP/1.1 semantics) and requests may be
+    pipelined. At most ``max_concurrency`` requests are handled at once;
+    requests for more than ``HTTP_OFFLOAD_THRESHOLD`` tokens are generated in
+    a thread pool of ``workers`` threads, so the event loop never blocks on
+    bulk work.
+    """
+    
+    def __init__(self, generator: Optional["TestTokenGenerator"] = None,
+                 max_concurrency: int = DEFAULT_HTTP_CONCURRENCY, workers: int = 4):
         """
-        Generate multiple test tokens at once.
-        
         Args:
-            count: Number of tokens to generate
-            token_type: Type of token ("github_classic", "github_fine_grained", "gitlab", "npm", "aws_access_key", or "aws_secret_key")
-            
-        Returns:
-            List of generated tokens
+            generator: Generator to serve from (default: a thread-safe one); it must be thread-safe
+            max_concurrency: Requests handled at once across all connections
+            workers: Threads generating bulk requests
         """
-        tokens = []
-        for _ in range(count):
-            if token_type.lower() == "github_classic":
-                tokens.append(self.generate_github_classic_token())
-            elif token_type.lower() == "github_fine_grained":
-                tokens.append(self.generate_github_fine_grained_token())
-            elif token_type.lower() == "gitlab":
-                tokens.append(self.generate_gitlab_token())
-            elif token_type.lower() == "npm":
-                tokens.append(self.generate_npm_token())
-            elif token_type.lower() == "aws_access_key":
-                tokens.append(self.generate_aws_access_key())
-            elif token_type.lower() == "aws_secret_key":
-                tokens.append(self.generate_aws_secret_key())
-            else:
-                raise ValueError("token_type must be 'github_classic', 'github_fine_grained', 'gitlab', 'npm', 'aws_access_key', or 'aws_secret_key'")
+        if generator is None:
+            generator = TestTokenGenerator(thread_safe=True)
+        elif not generator.thread_safe:
+            raise ValueError("the served generator must be thread_safe")
+        self.generator = generator
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="fake-tokens-http")
+        self._limit = None
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        """Start listening and return the ``asyncio`` server."""
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.start_server(self._handle_connection, host, port)
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, stream: asyncio.StreamWriter) -> None:
+        writer = _CorkedWriter(stream)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                try:
+                    request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+                    method, target, version = request_line.split(" ", 2)
+                    headers = {}
+                    for line in header_lines:
+                        name, _, value = line.partition(":")
+                        headers[name.lower()] = value.strip()
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError("negative Content-Length")
+                except ValueError:
+                    self._respond(writer, 400, b"malformed request\n", keep_alive=False)
+                    return
+                if length > MAX_HTTP_BODY:
+                    self._respond(writer, 413, b"request body too large\n", keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                async with self._limit:
+                    try:
+                        await self._dispatch(method, target, body, writer, keep_alive)
+                    except _StreamAborted:
+                        # Headers are out: closing without the last chunk tells the
+                        # client the body is incomplete
+                        return
+                    except _HTTPError as e:
+                        self._respond(writer, e.status, (str(e) + "\n").encode("utf-8"), keep_alive)
+                    except (ValueError, TypeError, OverflowError, RuntimeError) as e:
+                        self._respond(writer, 400, (str(e) + "\n").encode("utf-8"), keep_alive)
+                # Only wait for the socket once a backlog builds up, so pipelined
+                # requests are answered without a round trip through drain()
+                if stream.transport.get_write_buffer_size() > 65536 or not keep_alive:
+                    await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.flush()
+            stream.close()
+    
+    @staticmethod
+    def _respond(writer: _CorkedWriter, status: int, body: bytes, keep_alive: bool,
+                 content_type: str = "text/plain") -> None:
+        writer.write(f"HTTP/1.1 {status} {_HTTP_REASONS[status]}\r\n"
+                     f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("ascii") + body)
+    
+    async def _tokens(self, token_type: str, count: int) -> List[str]:
+        """Tokens for one request; bulk requests are generated off the event loop."""
+        request = {"type": token_type, "count": count}
+        if count <= HTTP_OFFLOAD_THRESHOLD:
+            return _answer(self.generator, request)
+        return await asyncio.get_event_loop().run_in_executor(self._executor, _answer, self.generator, request)
+    
+    async def _dispatch(self, method: str, target: str, body: bytes, writer: _CorkedWriter,
+                        keep_alive: bool) -> None:
+        path, _, query = target.partition("?")
+        params = urllib.parse.parse_qs(query) if query else {}
+        try:
+            count = int(params["count"][0]) if "count" in params else None
+        except ValueError:
+            raise _HTTPError(400, "count must be an integer")
         
-        return tokens
+        if path.startswith("/token/") or path.startswith("/stream/"):
+            if method != "GET":
+                raise _HTTPError(405, "use GET")
+            endpoint, _, token_type = path[1:].partition("/")
+            token_type = urllib.parse.unquote(token_type)
+            if endpoint == "stream":
+                if count is None:
+                    raise _HTTPError(400, "count is required")
+                await self._stream(writer, token_type, count, keep_alive)
+                return
+            tokens = await self._tokens(token_type, 1 if count is None else count)
+            self._respond(writer, 200, ("\n".join(tokens) + "\n").encode("ascii"), keep_alive)
+        elif path == "/batch":
+            if method != "POST":
+                raise _HTTPError(405, "use POST")
+            try:
+                counts = json.loads(body)
+            except ValueError:
+                raise _HTTPError(400, "body must be a JSON object of token type -> count")
+            if not isinstance(counts, dict) or not all(isinstance(n, int) for n in counts.values()):
+                raise _HTTPError(400, "body must be a JSON object of token type -> count")
+            if sum(counts.values()) > MAX_SERVE_COUNT:
+                raise _HTTPError(400, f"at most {MAX_SERVE_COUNT} tokens per batch")
+            result = {token_type: await self._tokens(token_type, n) for token_type, n in counts.items()}
+            self._respond(writer, 200, json.dumps(result).encode("ascii"), keep_alive, "application/json")
+        else:
+            raise _HTTPError(404, "not found; try /token/{type}, /batch or /stream/{type}")
     
-    def clear_history(self):
-        """Clear the history of generated tokens."""
-        self.generated_tokens.clear()
+    async def _stream(self, writer: _CorkedWriter, token_type: str, count: int, keep_alive: bool) -> None:
+        """Answer with ``count`` tokens in chunked transfer encoding, one chunk per batch."""
+        if count < 1:
+            raise _HTTPError(400, "count must be at least 1")
+        # Validate before the 200 status line goes out
+        first = await self._tokens(token_type, min(count, DEFAULT_CHUNK_SIZE))
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nTransfer-Encoding: chunked\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("ascii"))
+        remaining = count - len(first)
+        tokens = first
+        while True:
+            data = ("\n".join(tokens) + "\n").encode("ascii")
+            writer.write(b"%X\r\n%b\r\n" % (len(data), data))
+            await writer.drain()
+            if not remaining:
+                break
+            size = min(remaining, DEFAULT_CHUNK_SIZE)
+            try:
+                tokens = await self._tokens(token_type, size)
+            except (ValueError, TypeError, OverflowError, RuntimeError) as e:
+                # Too late for an error response, which would corrupt the chunked body
+                raise _StreamAborted from e
+            remaining -= size
+        writer.write(b"0\r\n\r\n")
     
-    def get_generated_count(self) -> int:
-        """Get the number of unique tokens generated so far."""
-        return len(self.generated_tokens)
+    def close(self) -> None:
+        """Stop the worker pool."""
+        self._executor.shutdown(wait=False)
+
+
+def serve_http(argv: Optional[List[str]] = None) -> None:
+    """``fake-tokens.py http``: run a ``TokenHTTPServer`` until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="fake-tokens.py http",
+        description="Serve fake tokens over HTTP from one warm generator: GET /token/{type}[?count=N], "
+                    "POST /batch with a JSON object of type -> count, GET /stream/{type}?count=N (chunked)"
+    )
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_HTTP_CONCURRENCY,
+                        help=f"Requests handled at once (default: {DEFAULT_HTTP_CONCURRENCY})")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Threads generating bulk requests (default: 4)")
+    parser.add_argument("--uniqueness", choices=["compact", "set", "bloom", "counter"], default="compact",
+                        help="Uniqueness mode of the served generator (default: compact)")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Keep ready pools of tokens refilled in the background (see prefetch=)")
+    args = parser.parse_args(argv)
+    
+    generator = TestTokenGenerator(uniqueness=args.uniqueness, thread_safe=True, prefetch=args.prefetch)
+    server = TokenHTTPServer(generator, args.max_concurrency, args.workers)
+    
+    # An explicit loop rather than asyncio.run / serve_forever, which need Python 3.7
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    listener = loop.run_until_complete(server.start(args.host, args.port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        loop.close()
+        server.close()
+
+
+def _per_character_batch(count: int, spec: TokenSpec) -> List[str]:
+    """Reference implementation drawing one ``secrets.choice`` per character (benchmark baseline)."""
+    seen = set()
+    tokens = []
+    while len(tokens) < count:
+        token = spec.prefix + ''.join(secrets.choice(spec.alphabet) for _ in range(spec.length))
+        if token not in seen:
+            seen.add(token)
+            tokens.append(token)
+    return tokens
+
+
+def benchmark(count: int, token_type: str = "github_classic") -> None:
+    """
+    Compare the pooled generator against the per-character ``secrets.choice`` path.
+    
+    Both record and check every token (the generator with
+    ``collision_threshold=None``), so the comparison is like for like.
+    
+    Args:
+        count: Number of tokens each implementation generates
+        token_type: Token type passed to ``generate_batch``
+    """
+    results = []
+    pooled = lambda: TestTokenGenerator(collision_threshold=None).generate_batch(count, token_type)
+    for label, generate in (("per-character", lambda: _per_character_batch(count, TOKEN_SPECS[token_type])),
+                            ("entropy pool", pooled)):
+        start = time.perf_counter()
+        generate()
+        elapsed = time.perf_counter() - start
+        results.append(elapsed)
+        print(f"{label:>14}: {count} x {token_type} in {elapsed:.3f}s ({count / elapsed:,.0f} tokens/s)")
+    print(f"{'speedup':>14}: {results[0] / results[1]:.1f}x")
+
+
+def benchmark_threads(count: int, token_type: str = "github_classic", max_threads: Optional[int] = None) -> None:
+    """
+    Measure how a shared ``thread_safe`` generator scales across threads.
+    
+    Every token is checked against the striped history, and the run is
+    repeated with 1, 2, 4, ... up to ``max_threads`` threads splitting
+    ``count`` tokens between them. Threads only run in parallel on a
+    free-threaded (no-GIL) build.
+    
+    Args:
+        count: Number of tokens generated per run
+        token_type: Token type generated
+        max_threads: Largest thread count (default: the number of CPUs)
+    """
+    max_threads = max_threads or os.cpu_count() or 1
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"GIL {'enabled' if gil else 'disabled'}; {os.cpu_count()} CPUs")
+    baseline = None
+    threads = 1
+    while threads <= max_threads:
+        generator = TestTokenGenerator(thread_safe=True, collision_threshold=None, capacity=count)
+        sizes = list(_chunk_sizes(count, DEFAULT_CHUNK_SIZE))
+        with ThreadPoolExecutor(threads) as executor:
+            start = time.perf_counter()
+            for _ in executor.map(lambda size: generator.generate_batch(size, token_type), sizes):
+                pass
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        assert generator.get_generated_count() == count
+        print(f"{threads:>3} threads: {count} x {token_type} in {elapsed:.3f}s "
+              f"({count / elapsed:,.0f} tokens/s, {baseline / elapsed:.1f}x)")
+        threads *= 2
+
+
+def _parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a ``--shard`` argument of the form ``ID/COUNT``."""
+    try:
+        shard_id, shard_count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected ID/COUNT, e.g. 3/8")
+    if not 0 <= shard_id < shard_count:
+        raise argparse.ArgumentTypeError("shard ID must be in the range 0..COUNT-1")
+    return shard_id, shard_count
+
+
+def _parse_token_types(value: str) -> List[Tuple[str, Optional[int]]]:
+    """
+    Parse a ``--type`` argument: one type, or a comma-separated list of types with optional counts.
+    
+    ``npm`` and ``github_classic=3,npm=1`` are both accepted; a type without
+    ``=COUNT`` gets the ``--count`` value (returned as None here).
+    """
+    types = []
+    for part in value.split(","):
+        name, sep, count = part.strip().partition("=")
+        name = name.lower()
+        if name not in TOKEN_SPECS:
+            raise argparse.ArgumentTypeError(f"unknown token type {name!r} (choose from {', '.join(TOKEN_SPECS)})")
+        if not sep:
+            types.append((name, None))
+            continue
+        try:
+            types.append((name, int(count)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected TYPE=COUNT, e.g. {name}=3")
+        if types[-1][1] < 0:
+            raise argparse.ArgumentTypeError(f"count for {name!r} must not be negative")
+    return types
+
+
+def benchmark_memory(count: int, token_type: str = "github_classic") -> None:
+    """
+    Compare the memory of the ``set`` history against ``CompactStore`` for ``count`` tokens.
+    
+    Args:
+        count: Number of tokens recorded in each store
+        token_type: Token type recorded
+    """
+    tokens = SetStore()
+    compact = CompactStore()
+    compiled = _resolve_token_type(token_type)
+    pool = _EntropyPool()
+    for size in _chunk_sizes(count, DEFAULT_CHUNK_SIZE):
+        for token in compiled.batch(pool, size):
+            tokens.add(token)
+            compact.add(token)
+    set_bytes = sys.getsizeof(tokens) + sum(sys.getsizeof(token) for token in tokens)
+    compact_bytes = compact.memory_usage()
+    for label, size in (("set of str", set_bytes), ("compact store", compact_bytes)):
+        print(f"{label:>14}: {count} x {token_type} in {size / 2 ** 20:,.1f} MiB ({size / count:.1f} bytes/token)")
+    print(f"{'reduction':>14}: {set_bytes / compact_bytes:.1f}x")
 
 
 def main():
     """Main function with command line argument parsing."""
+    if sys.argv[1:2] == ["serve"]:
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["http"]:
+        serve_http(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
         description="Generate fake tokens for testing (GitHub, GitLab, NPM, and AWS)",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -219,6 +3157,18 @@ Examples:
   %(prog)s -t aws_access_key        # Generate AWS access key
   %(prog)s -t aws_secret_key        # Generate AWS secret key
   %(prog)s -c 3 -t aws_access_key   # Generate 3 AWS access keys
+  %(prog)s -t github_classic=3,npm=1  # 3 GitHub classic tokens, then 1 NPM token
+  %(prog)s -c 10000000 -j 4         # Generate 10M tokens with 4 worker processes
+  %(prog)s -c 1000 --shard 2/8      # Generate 1000 tokens as shard 2 of 8
+  %(prog)s -c 3 --seed 42           # The same 3 tokens on every run
+  %(prog)s -c 2000000000 --seed 1 -o fixtures.txt --checkpoint fixtures.ckpt  # Resumable with --resume
+  %(prog)s -c 1000 --registry ci.reg  # Never repeat a token emitted by any run using ci.reg
+  %(prog)s serve --socket /tmp/tokens.sock  # Serve tokens from a warm generator
+  %(prog)s --socket /tmp/tokens.sock -c 5  # Fetch 5 tokens from that server
+  %(prog)s http --port 8080         # Serve tokens over HTTP (GET /token/npm, POST /batch, ...)
+  %(prog)s --benchmark -c 100000    # Compare generation throughput
+  %(prog)s --benchmark memory -c 1000000  # Compare uniqueness history memory
+  %(prog)s --benchmark threads -c 1000000 -j 8  # Thread scaling (parallel on no-GIL builds)
         """
     )
     
@@ -231,19 +3181,173 @@ Examples:
     
     parser.add_argument(
         "-t", "--type",
-        choices=["github_classic", "github_fine_grained", "gitlab", "npm", "aws_access_key", "aws_secret_key"],
+        type=_parse_token_types,
         default="github_classic",
-        help="Token type to generate (default: github_classic)"
+        metavar="TYPE[=COUNT],...",
+        help=f"Token type to generate, or several with their own counts, e.g. github_classic=3,npm=1 "
+             f"(types without a count get --count; default: github_classic). Types: {', '.join(TOKEN_SPECS)}"
+    )
+    
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes generating tokens (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--shard",
+        type=_parse_shard,
+        metavar="ID/COUNT",
+        help="Encode shard ID of COUNT into every token so separate runs never collide"
+    )
+    
+    parser.add_argument(
+        "--counter",
+        action="store_true",
+        help="Derive tokens from a keyed permutation of a counter: unique by construction, no history kept"
+    )
+    
+    parser.add_argument(
+        "--seed",
+        help="Make the output reproducible: the same seed and options always print the same tokens"
+    )
+    
+    parser.add_argument(
+        "-o", "--output",
+        metavar="FILE",
+        help="Write tokens to FILE instead of standard output"
+    )
+    
+    parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="With --seed and --output, save the generator state to FILE every --checkpoint-every tokens"
+    )
+    
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=DEFAULT_CHECKPOINT_INTERVAL,
+        metavar="N",
+        help=f"Tokens written between checkpoints (default: {DEFAULT_CHECKPOINT_INTERVAL})"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted --checkpoint run with the same options, where its last checkpoint left off"
+    )
+    
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Fetch the tokens from a running 'serve' daemon on PATH instead of generating them"
+    )
+    
+    parser.add_argument(
+        "--registry",
+        metavar="PATH",
+        help="Check and record every token in a fingerprint file shared by all runs using it, "
+             "so separate (and concurrent) runs never emit the same token"
+    )
+    
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_OUTPUT_BUFFER_SIZE,
+        help=f"Bytes of output buffered before each write (default: {DEFAULT_OUTPUT_BUFFER_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--benchmark",
+        nargs="?",
+        const="throughput",
+        choices=["throughput", "memory", "threads"],
+        help="Instead of printing tokens, benchmark generation throughput against per-character "
+             "generation, the memory of the uniqueness history against a set of strings, or the "
+             "scaling of a thread-safe generator across up to --jobs threads"
     )
     
     args = parser.parse_args()
+    types = [(name, args.count if count is None else count) for name, count in args.type]
+    if len(types) == 1:
+        args.type, args.count = types[0]
+    elif args.benchmark is not None or args.checkpoint is not None:
+        parser.error("--benchmark and --checkpoint take a single --type")
     
-    generator = TestTokenGenerator()
+    if args.benchmark == "throughput":
+        benchmark(args.count, args.type)
+        return
+    if args.benchmark == "memory":
+        benchmark_memory(args.count, args.type)
+        return
+    if args.benchmark == "threads":
+        benchmark_threads(args.count, args.type, args.jobs if args.jobs > 1 else None)
+        return
     
-    # Generate and output tokens
-    tokens = generator.generate_batch(args.count, args.type)
-    for token in tokens:
-        print(token)
+    if args.shard is not None and args.counter:
+        parser.error("--shard and --counter are mutually exclusive")
+    if args.registry is not None and (args.shard is not None or args.counter):
+        parser.error("--registry cannot be combined with --shard or --counter")
+    if args.shard is not None and args.jobs > 1:
+        parser.error("--shard cannot be combined with --jobs; run one process per shard ID instead")
+    if args.seed is not None and args.jobs > 1 and not args.counter:
+        parser.error("--seed can only be combined with --jobs in --counter mode")
+    if args.checkpoint is not None and (args.seed is None or args.output is None):
+        parser.error("--checkpoint requires --seed and --output")
+    if args.checkpoint is not None and (args.jobs > 1 or args.registry is not None):
+        parser.error("--checkpoint cannot be combined with --jobs or --registry")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    if args.checkpoint_every < 1:
+        parser.error("--checkpoint-every must be at least 1")
+    if args.socket is not None and (args.shard is not None or args.counter or args.seed is not None
+                                    or args.registry is not None):
+        parser.error("--socket uses the server's generator; give uniqueness options to 'serve' instead")
+    if args.shard is not None:
+        generator = TestTokenGenerator(uniqueness="shard", shard_id=args.shard[0], shard_count=args.shard[1],
+                                       seed=args.seed)
+    elif args.counter:
+        generator = TestTokenGenerator(uniqueness="counter", seed=args.seed)
+    elif args.registry is not None:
+        try:
+            registry = RegistryStore(args.registry)
+        except (ValueError, OSError) as e:
+            parser.error(f"--registry: {e}")
+        # Every token goes into the registry, however unlikely a collision within this run
+        generator = TestTokenGenerator(store=registry, collision_threshold=None, seed=args.seed)
+    else:
+        generator = TestTokenGenerator(seed=args.seed)
+    
+    if args.checkpoint is not None:
+        try:
+            write_checkpointed(generator, args.output, args.checkpoint, args.count, args.type,
+                               args.checkpoint_every, args.resume)
+        except ValueError as e:
+            # A checkpoint left by a run with other options
+            parser.error(f"--resume: {e}")
+        return
+    
+    # Stream tokens so large counts never need to be held in memory at once; a
+    # type list is printed in order, every type drawing from the same generator
+    try:
+        with TokenClient(args.socket) if args.socket is not None else nullcontext() as client:
+            if client is not None:
+                chunks = (chunk for name, count in types for chunk in client.iter_chunks(name, count))
+            else:
+                chunks = (chunk for name, count in types for chunk in generator._iter_packed(name, count, args.jobs))
+            if args.output is not None:
+                with open(args.output, "wb") as output:
+                    write_tokens(chunks, output, args.buffer_size)
+            else:
+                write_tokens(chunks, buffer_size=args.buffer_size)
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); point stdout at devnull so the
+        # interpreter's final flush doesn't raise again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
 
 
 if __name__ == "__main__":